@@ -1,146 +1,519 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, redirect
 from flask_cors import CORS
 import os
+import hmac
 import time
-import glob
 import re
-import yt_dlp
-from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import safe_join
 import traceback
+import uuid
+import threading
+from result_cache import ResultCache
+from singleflight import SingleFlight
+from metadata_cache import shared_cache as metadata_cache
+from postprocess import plan_postprocessing, apply_plan, AUDIO_FORMATS, OUTPUT_MODES
+from format_budget import make_budget, fit_format, pin_format, LinkSpeed
+from file_serving import send_media, content_type_for, content_disposition
+from live_stream import LiveFile, is_streamable
+from scheduler import JobScheduler, QueueFull, StagePool
+from job_store import JobStore, SQLiteJobStore
+from job_queue import SQLiteJobQueue
+from storage import StorageManager
+from batch import resolve_entries, run_batch, ready_batch_files, stream_zip
+from ydl_pool import YDLPool, SharedCookieJar
+from fetch_tuner import FetchTuner, is_fragmented
+from url_canon import canonicalize, dedupe_urls
+from metrics import registry, JobTimer, JOBS_TOTAL, DOWNLOAD_BYTES, TRANSFER_SECONDS, SERVE_BYTES, SERVE_SECONDS
+from progress import StatusRecord, ProgressTracker, StageRates, stream_progress, present, format_bytes
 
 app = Flask(__name__)
 CORS(app)
 os.makedirs('static/downloads', exist_ok=True)
 
-download_status = {}
-executor = ThreadPoolExecutor(max_workers=4)
+# ⚙️ WORKER_QUEUE_PATH = run jobs in worker.py processes instead of in-process threads
+WORKER_QUEUE_PATH = os.environ.get('WORKER_QUEUE_PATH')
+WORKER_MODE = bool(WORKER_QUEUE_PATH)
 
-def format_bytes(size):
-    """Format bytes to human readable"""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size < 1024:
-            return f"{size:.1f} {unit}"
-        size /= 1024
-    return f"{size:.1f} GB"
+# 🗃️ Bounded job records - JOB_STORE_PATH switches to SQLite (restart-safe, multi-process)
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH')
+if WORKER_MODE and not JOB_STORE_PATH:
+    JOB_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(WORKER_QUEUE_PATH)), 'jobs.db')
+JOB_TTL = int(os.environ.get('JOB_TTL', 6 * 3600))
+JOB_STORE_MAX = int(os.environ.get('JOB_STORE_MAX', 10000))
+# 💓 Workers renew claims and records every HEARTBEAT_INTERVAL s - silent for CLAIM_TIMEOUT s = dead
+HEARTBEAT_INTERVAL = int(os.environ.get('HEARTBEAT_INTERVAL', 30))
+CLAIM_TIMEOUT = int(os.environ.get('CLAIM_TIMEOUT', 300))
+if JOB_STORE_PATH:
+    download_status = SQLiteJobStore(JOB_STORE_PATH, shared=WORKER_MODE, max_jobs=JOB_STORE_MAX, ttl=JOB_TTL,
+                                     stale_after=CLAIM_TIMEOUT if WORKER_MODE else 3600)
+else:
+    download_status = JobStore(max_jobs=JOB_STORE_MAX, ttl=JOB_TTL)
+
+# 🚦 Bounded priority queue - per-platform caps so one slow site can't take every worker
+PLATFORM_LIMITS = {'Instagram': 2, 'Facebook': 2, 'YouTube': 3, 'TikTok': 3, 'X': 3}
+PLATFORM_RATES = {'Instagram': 30, 'Facebook': 30}  # job starts per minute
+PRIORITY_TOKEN = os.environ.get('PRIORITY_TOKEN')  # 'high' lane only for callers sending it (X-Priority-Token)
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 4))
+DOWNLOAD_QUEUE_SIZE = int(os.environ.get('DOWNLOAD_QUEUE_SIZE', 64))
+if WORKER_MODE:
+    scheduler = None
+    job_queue = SQLiteJobQueue(WORKER_QUEUE_PATH, max_queue=DOWNLOAD_QUEUE_SIZE,
+                               platform_limits=PLATFORM_LIMITS, workers=DOWNLOAD_WORKERS,
+                               claim_timeout=CLAIM_TIMEOUT)
+else:
+    job_queue = None
+    scheduler = JobScheduler(
+        max_workers=DOWNLOAD_WORKERS,
+        max_queue=DOWNLOAD_QUEUE_SIZE,
+        platform_limits=PLATFORM_LIMITS,
+        platform_rates=PLATFORM_RATES,
+        on_change=lambda: publish_queue_positions(),
+    )
+
+# 🏭 CPU-bound ffmpeg work (merge, remux, convert) runs on its own pool, one thread per core -
+# download slots are freed as soon as the bytes are on disk
+FFMPEG_WORKERS = int(os.environ.get('FFMPEG_WORKERS', os.cpu_count() or 2))
+FFMPEG_BACKLOG = int(os.environ.get('FFMPEG_BACKLOG', DOWNLOAD_WORKERS * 2))
+ffmpeg_pool = StagePool('ffmpeg', FFMPEG_WORKERS, max_backlog=FFMPEG_BACKLOG)
+
+# 📊 Worker processes dump their metrics here for the web tier's /metrics
+METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(WORKER_QUEUE_PATH or 'queue.db')), 'metrics')
+
+def queue_stats():
+    return (job_queue or scheduler).stats()
+
+registry.gauge('download_queue_depth', 'Jobs waiting for a worker', lambda: queue_stats()['queued'])
+registry.gauge('download_jobs_running', 'Jobs running now', lambda: queue_stats()['running'])
+registry.gauge('download_workers', 'Configured download workers', lambda: queue_stats()['workers'])
+registry.gauge('download_worker_utilization', 'Running jobs / workers',
+               lambda: queue_stats()['running'] / max(queue_stats()['workers'], 1))
+registry.gauge('download_jobs_running_by_platform', 'Running jobs per platform',
+               lambda: [({'platform': p}, n) for p, n in queue_stats()['by_platform'].items()])
+registry.gauge('ffmpeg_queue_depth', 'Jobs waiting for an ffmpeg worker', lambda: ffmpeg_pool.stats()['queued'])
+registry.gauge('ffmpeg_jobs_running', 'Post-processing jobs running now', lambda: ffmpeg_pool.stats()['running'])
+registry.gauge('ffmpeg_workers', 'Configured ffmpeg workers', lambda: ffmpeg_pool.stats()['workers'])
+registry.gauge('storage_bytes', 'Bytes of finished files in static/downloads', lambda: storage.usage()['bytes'])
+registry.gauge('job_store_records', 'Job records held in memory', lambda: len(download_status))
+
+# 💾 Finished files are reused across jobs
+result_cache = ResultCache('static/downloads', max_bytes=None)
+
+# 🧹 Disk quota over static/downloads - evicts LRU down to the low-water mark
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 5 * 1024 ** 3))
+STORAGE_LOW_WATER = int(os.environ.get('STORAGE_LOW_WATER', CACHE_MAX_BYTES * 0.8))
+TEMP_MAX_AGE = int(os.environ.get('TEMP_MAX_AGE', 6 * 3600))
+TEMP_ORPHAN_GRACE = int(os.environ.get('TEMP_ORPHAN_GRACE', 600))
+# ⚙️ Worker mode: workers write files, the web tier (which pins served files) alone evicts
+STORAGE_EVICT = os.environ.get('STORAGE_EVICT', '1') == '1'
+storage = StorageManager('static/downloads', quota_bytes=CACHE_MAX_BYTES, low_water_bytes=STORAGE_LOW_WATER,
+                         temp_max_age=TEMP_MAX_AGE, on_evict=result_cache.forget_file,
+                         resumable=download_status.resumable_temps, orphan_grace=TEMP_ORPHAN_GRACE,
+                         evict=STORAGE_EVICT, shared=WORKER_MODE).start()
+
+# 🛫 One extraction/download/transcode per media item at a time
+url_flights = SingleFlight()
+media_flights = SingleFlight()
+
+# 📡 Jobs whose file can be streamed while it is still downloading
+live_streams = {}
+
+FORMAT_SELECTORS = {
+    'Instagram': 'bestvideo[height<=1080]+bestaudio/best[height<=1080]/best',
+    'Facebook': 'bestvideo[height<=1080]+bestaudio/best[height<=1080]/best',
+    'YouTube': 'best[height<=720][ext=mp4]/best[ext=mp4]/best',
+    'TikTok': 'best[height<=1080]/best',
+    'X': 'best[height<=1080]/best',
+}
+DEFAULT_FORMAT = 'best[height<=720]/best'
+
+# 📏 Size/bandwidth budget - server-wide caps (FORMAT_MAX_SIZE '200M', FORMAT_MAX_TIME s,
+# FORMAT_MAX_BITRATE kbit/s); callers can only tighten them
+DEFAULT_BUDGET = make_budget(os.environ.get('FORMAT_MAX_SIZE'), os.environ.get('FORMAT_MAX_TIME'),
+                             os.environ.get('FORMAT_MAX_BITRATE'))
+LINK_SPEED_DEFAULT = int(os.environ.get('LINK_SPEED_DEFAULT', 4 * 1024 * 1024))  # bytes/s until measured
+link_speeds = LinkSpeed(LINK_SPEED_DEFAULT)
+registry.gauge('link_speed_bytes_per_second', 'Smoothed download speed per platform',
+               lambda: [({'platform': p}, v) for p, v in link_speeds.snapshot().items()])
+
+# 🧺 Batch/playlist fan-out
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 200))
+BATCH_PARALLELISM = int(os.environ.get('BATCH_PARALLELISM', 3))
+# 🚦 Playlist resolution + fan-out runs on a bounded pool - /batch answers 429 once it is full
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+BATCH_BACKLOG = int(os.environ.get('BATCH_BACKLOG', 16))
+batch_pool = StagePool('batch', BATCH_WORKERS, max_backlog=BATCH_BACKLOG)
+registry.gauge('batch_queue_depth', 'Batches waiting to be resolved', lambda: batch_pool.stats()['queued'])
+registry.gauge('batch_jobs_running', 'Batches being resolved or fanned out', lambda: batch_pool.stats()['running'])
+
+INSTAGRAM_FB_UA = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# 🎞️ Every job ends as an mp4 - postprocessing is planned per job from the codecs
+OUTPUT_FORMAT = 'mp4'
+
+# 🏊 Reused YoutubeDL per platform - keep-alive connections, extractors and cookies survive jobs
+COOKIE_PLATFORMS = ('Instagram', 'Facebook')
+COOKIE_FILE = os.environ.get('COOKIE_FILE', 'cookies.txt')
+YDL_POOL_IDLE = int(os.environ.get('YDL_POOL_IDLE', DOWNLOAD_WORKERS))
+
+def ydl_base_opts(platform):
+    """Options fixed for a pooled instance's life - per-job ones go to ydl_pool.session"""
+    opts = {
+        'quiet': False,
+        'no_warnings': True,
+        'noplaylist': True,
+        'socket_timeout': 20,
+        'retries': 5,
+        'fragment_retries': 5,
+        'concurrent_fragment_downloads': 4,  # 🎛️ per fetch: fetch_tuner.lease()
+    }
+    if platform in COOKIE_PLATFORMS:
+        opts['http_headers'] = {'User-Agent': INSTAGRAM_FB_UA}
+    return opts
+
+ydl_pool = YDLPool(ydl_base_opts, cookie_jar=SharedCookieJar(COOKIE_FILE),
+                   cookie_keys=COOKIE_PLATFORMS, max_idle=YDL_POOL_IDLE)
+registry.gauge('ydl_pool_instances_created', 'YoutubeDL instances built', lambda: ydl_pool.stats()['created'])
+registry.gauge('ydl_pool_checkouts_reused', 'Jobs that reused a pooled YoutubeDL', lambda: ydl_pool.stats()['reused'])
+
+# 🎛️ Fragment threads/retries/timeouts learned per platform, within one connection budget per host
+# (worker.py splits it between its processes)
+FETCH_CONNECTION_BUDGET = int(os.environ.get('FETCH_CONNECTION_BUDGET', 16))
+FETCH_MAX_FRAGMENTS = int(os.environ.get('FETCH_MAX_FRAGMENTS', 16))
+fetch_tuner = FetchTuner(budget=FETCH_CONNECTION_BUDGET, max_fragments=FETCH_MAX_FRAGMENTS)
+
+def tuner_gauge(field):
+    return lambda: [({'platform': p}, s[field]) for p, s in fetch_tuner.snapshot()['platforms'].items()
+                    if s[field] is not None]
+
+registry.gauge('fetch_connections_in_use', 'Fragment connections leased by running fetches',
+               lambda: fetch_tuner.snapshot()['in_use'])
+registry.gauge('fetch_fragment_limit', 'Learned concurrent fragment limit per platform', tuner_gauge('limit'))
+registry.gauge('fetch_retry_rate', 'Smoothed retries per fetch per platform', tuner_gauge('retry_rate'))
+registry.gauge('fetch_connection_speed_bytes', 'Smoothed bytes/s per connection per platform', tuner_gauge('speed'))
+
+# 📈 Job progress - record writes per job per second, and ffmpeg seconds per MB learned per mode
+PROGRESS_INTERVAL = float(os.environ.get('PROGRESS_INTERVAL', 0.5))
+postprocess_rates = StageRates({'remux': 0.02, 'transcode': 0.5})
+registry.gauge('postprocess_seconds_per_mb', 'Smoothed ffmpeg seconds per MB of input per mode',
+               lambda: [({'mode': m}, v) for m, v in postprocess_rates.snapshot().items()])
 
 def detect_platform(url):
-    """Detect social media platform"""
-    url_lower = url.lower()
-    if any(x in url_lower for x in ['instagram.com', 'instagr.am']):
-        return 'Instagram'
-    elif any(x in url_lower for x in ['facebook.com', 'fb.watch']):
-        return 'Facebook'
-    elif 'youtube.com' in url_lower or 'youtu.be' in url_lower:
-        return 'YouTube'
-    elif 'tiktok.com' in url_lower:
-        return 'TikTok'
-    elif any(x in url_lower for x in ['twitter.com', 'x.com']):
-        return 'X'
-    return 'Video'
+    """Detect social media platform - by host suffix, so netflix.com is not X"""
+    return canonicalize(url).platform
 
 def temp_cleanup():
-    """🧹 Clean temp files - Windows safe"""
+    """🧹 Clean abandoned temp dirs - the storage sweeper keeps doing this while running"""
     try:
-        temp_dir = 'static/downloads/.temp'
-        if os.path.exists(temp_dir):
-            for temp_file in glob.glob(f'{temp_dir}/**/*', recursive=True):
-                if os.path.isfile(temp_file):
-                    try:
-                        os.remove(temp_file)
-                    except:
-                        pass
-    except:
-        pass
-
-def bulletproof_social_download(url, status_dict=None, download_id=None):
-    """🔥 v4.3 - FFmpeg FIXED NO 'when' parameter"""
+        storage.sweep_temp()
+    except Exception as e:
+        print(f"⚠️ Temp cleanup failed: {e}")
+
+def job_format(platform, mode='video'):
+    """🎯 (format selector, output extension) - audio modes fetch only the audio stream"""
+    if mode in AUDIO_FORMATS:
+        return AUDIO_FORMATS[mode]['selector'], mode
+    return FORMAT_SELECTORS.get(platform, DEFAULT_FORMAT), OUTPUT_FORMAT
+
+def job_budget(form):
+    """📏 Caller limits (max_size / max_time / max_bitrate) tightened by DEFAULT_BUDGET - ValueError if bad"""
+    budget = make_budget(form.get('max_size'), form.get('max_time'), form.get('max_bitrate'))
+    for limit, value in DEFAULT_BUDGET.items():
+        budget[limit] = min(budget.get(limit, value), value)
+    return budget
+
+def job_priority(form, headers):
+    """🚦 Server-side lane - callers may drop their job to 'low', 'high' needs PRIORITY_TOKEN"""
+    wanted = form.get('priority', 'normal')
+    if wanted == 'low':
+        return 'low'
+    token = headers.get('X-Priority-Token', '')
+    if wanted == 'high' and PRIORITY_TOKEN and hmac.compare_digest(token, PRIORITY_TOKEN):
+        return 'high'
+    return 'normal'
+
+def cache_alias(url, format_selector, target=OUTPUT_FORMAT, budget=None):
+    """💾 Pre-extraction cache key - youtu.be, watch?v= and shorts/ forms of one video share it"""
+    return ResultCache.make_key('url', canonicalize(url).key, format_selector, target, *([budget] if budget else []))
+
+def media_cache_key(platform, media_id, format_selector, target=OUTPUT_FORMAT, budget=None):
+    """💾 Result cache key - from the extracted id, or the id parsed offline from the URL"""
+    return ResultCache.make_key(platform, media_id, format_selector, target, *([budget] if budget else []))
+
+def mark_cache_hit(status_dict, download_id, entry):
+    """✅ Complete a job straight from a cached file"""
+    status_dict[download_id].update({
+        'progress': 100,
+        'status': 'complete',
+        'success': True,
+        'cache': 'hit',
+        'download_url': f"/download/{entry['filename']}",
+        'filename': entry['filename'],
+        'filesize': format_bytes(entry['filesize']),
+        'info': entry.get('info', {}),
+    })
+
+def needs_ffmpeg(ydl, deferred):
+    """True when post-processing has real work - a merge, a fixup or a planned ffmpeg pass"""
+    return bool(ydl._pps['post_process']) or any(info.get('__postprocessors') for _, info, _ in deferred)
+
+def run_postprocessors(ydl, deferred):
+    """🎞️ yt-dlp's own post_process for each download the fetch stage deferred - returns the final path"""
+    filepath = None
+    for filename, info, files_to_move in deferred:
+        for pp in info.get('__postprocessors') or []:
+            pp.set_downloader(ydl)  # merger/fixups were built on the fetch stage's instance
+        filepath = ydl.post_process(filename, info, files_to_move)['filepath']
+    return filepath
+
+def bulletproof_social_download(url, status_dict=None, download_id=None, mode='video', budget=None, on_finish=None):
+    """🔥 v4.3 - resolve -> fetch in the caller's slot, post-process -> publish on ffmpeg_pool
+
+    Jobs without ffmpeg work finish inline; handed-off jobs return
+    ``(None, filename, info)``, followers of the same media in flight
+    ``(None, None, info)``. ``on_finish`` runs once the last stage is
+    over, on whichever thread that is.
+    """
     
     print(f"🎯 DOWNLOAD: {url}")
     
+    def resume_point(d):
+        # ♻️ Where a restarted job picks up - yt-dlp resumes .part files and fragments itself
+        return {'resume': {**(status_dict[download_id].get('resume') or {}),
+                           'part': os.path.basename(d.get('tmpfilename') or ''),
+                           'offset': d.get('downloaded_bytes') or 0,
+                           'fragment': d.get('fragment_index')}}
+    
+    # 📈 Hooks only count bytes - the record is written PROGRESS_INTERVAL apart, strings built on read
+    tracker = ProgressTracker(status_dict[download_id], PROGRESS_INTERVAL, extra=resume_point)
+    tracker.stage('resolve')
+    
+    lease = None
+    
     def safe_progress_hook(d):
         """🛡️ SAFE Progress - No crashes"""
         try:
-            if not isinstance(d, dict) or d.get('status') != 'downloading':
-                return
-            total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-            downloaded = d.get('downloaded_bytes', 0)
-            if total > 0:
-                progress = 100 if (downloaded / total) >= 0.95 else int((downloaded / total) * 100)
-                status_dict[download_id].update({
-                    'progress': progress,
-                    'speed': d.get('speed_string', '0 KB/s'),
-                    'downloaded': format_bytes(downloaded),
-                    'total': format_bytes(total)
-                })
+            if lease is not None:
+                lease.observe(d)
+            live = live_streams.get(download_id)
+            if live is not None and d.get('status') in ('downloading', 'finished'):
+                live.grow(d.get('tmpfilename') or d.get('filename'),
+                          d.get('downloaded_bytes'), d.get('total_bytes'))
+            tracker.hook(d)
         except:
             pass
     
-    platform = detect_platform(url)
+    canon = canonicalize(url)
+    platform = canon.platform
     
-    # 🔥 UNIQUE FILENAME - NO CONFLICTS
-    timestamp = int(time.time() * 1000)
-    safe_filename = f"{platform}_{timestamp}"
+    # ⏱️ Stage spans -> /metrics histograms + 'timings' in the job record
+    timer = JobTimer(platform, status_dict[download_id])
+    created = status_dict[download_id].get('created')
+    if created:
+        timer.add('queue', time.time() - created)
+    pp_started = {}
     
-    format_selectors = {
-        'Instagram': 'bestvideo[height<=1080]+bestaudio/best[height<=1080]/best',
-        'Facebook': 'bestvideo[height<=1080]+bestaudio/best[height<=1080]/best',
-        'YouTube': 'best[height<=720][ext=mp4]/best[ext=mp4]/best',
-        'TikTok': 'best[height<=1080]/best',
-        'X': 'best[height<=1080]/best',
-    }
+    def pp_timing_hook(d):
+        if d.get('status') == 'started':
+            pp_started[d.get('postprocessor')] = time.perf_counter()
+        elif d.get('status') == 'finished' and d.get('postprocessor') in pp_started:
+            timer.add('postprocess', time.perf_counter() - pp_started.pop(d.get('postprocessor')))
+    
+    format_selector, target = job_format(platform, mode)
+    download_format = format_selector
+    
+    # ♻️ Interrupted job - same temp dir and format so yt-dlp continues the partial files
+    resume = status_dict[download_id].get('resume') or {}
+    if resume.get('temp') and os.path.isdir(os.path.join(storage.temp_root, resume['temp'])):
+        safe_filename = resume['temp']
+        if resume.get('format_id'):
+            download_format = f"{resume['format_id']}/{format_selector}"
+        print(f"♻️ RESUMING {safe_filename} from {format_bytes(resume.get('offset') or 0)}")
+    else:
+        # 🔥 UNIQUE FILENAME - NO CONFLICTS
+        timestamp = int(time.time() * 1000)
+        safe_filename = f"{platform}_{timestamp}_{uuid.uuid4().hex[:6]}"  # parallel jobs share milliseconds
     
     # 🔥 v4.3 ULTIMATE FFmpeg FIX - NO 'when' parameter
+    # 🔑 Cookies + headers for Instagram/FB come with the pooled instance (ydl_base_opts)
     ydl_opts = {
-        'format': format_selectors.get(platform, 'best[height<=720]/best'),
+        'format': download_format,
         'progress_hooks': [safe_progress_hook],
-        'quiet': False,
-        'no_warnings': True,
-        'noplaylist': True,
-        'socket_timeout': 20,
-        'retries': 5,
-        'fragment_retries': 5,
-        'concurrent_fragments': 4,
-        # 🔥 Windows temp fix
-        'temp_dir': f'static/downloads/.temp/{safe_filename}',
-        'outtmpl': f'static/downloads/{safe_filename}_%(id)s.%(ext)s',
-        # ✅ FIXED FFmpeg - NO 'when' = DEFAULT WORKS EVERYTIME
-        'postprocessors': [{
-            'key': 'FFmpegVideoConvertor',
-            'preferedformat': 'mp4'  # 🔥 THIS IS ALL YOU NEED
-        }],
+        'postprocessor_hooks': [pp_timing_hook],
+        # 🔥 Windows temp fix - parts/fragments live in .temp/<job> until done
+        'paths': {'home': 'static/downloads', 'temp': f'.temp/{safe_filename}'},
+        'outtmpl': f'{safe_filename}_%(id)s.%(ext)s',
     }
+    pp_opts = {k: v for k, v in ydl_opts.items() if k != 'progress_hooks'}
+    
+    status_dict[download_id]['cache'] = 'miss'
+    media_flight_key = None
+    handed_off = False
+    preview_filename = None
     
-    # 🔑 Cookies + Headers for Instagram/FB
-    if platform in ['Instagram', 'Facebook']:
-        if os.path.exists('cookies.txt'):
-            ydl_opts['cookies'] = 'cookies.txt'
-        ydl_opts['http_headers'] = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
+    def finish():
+        """🧹 Last stage is over - release the flights, live stream and temp dir, then the caller"""
+        if media_flight_key:
+            media_flights.finish(media_flight_key)
+        live = live_streams.pop(download_id, None)
+        if live is not None:
+            live.finish(bool(status_dict[download_id].get('success')))
+        storage.release_temp(safe_filename)
+        if on_finish:
+            on_finish()
+    
+    def fail(e):
+        error_msg = str(e)
+        print(f"💥 ERROR: {error_msg}")
+        print(f"Traceback: {traceback.format_exc()}")
+        JOBS_TOTAL.inc(platform=platform, outcome='error')
+        
+        status_dict[download_id].update({
+            'progress': 0,
+            'status': 'error',
+            'error': error_msg[:100]
+        })
+        return False, None, error_msg
+    
+    def publish(latest_file):
+        """📦 Move the finished file into place and complete the job"""
+        nonlocal preview_filename
+        tracker.stage('publish')
+        stage_start = time.perf_counter()
+        if not latest_file or not os.path.isfile(latest_file):
+            raise Exception("No output file reported by yt-dlp")
+        filesize = os.path.getsize(latest_file)
+        
+        print(f"📁 Output: {os.path.basename(latest_file)} ({format_bytes(filesize)})")
+        
+        if filesize <= 500:
+            raise Exception(f"File too small: {filesize} bytes")
+        final_path = f'static/downloads/{preview_filename}'
+        
+        # 🔑 One atomic move into place
+        try:
+            if os.path.abspath(latest_file) != os.path.abspath(final_path):
+                os.replace(latest_file, final_path)
+        except OSError as rename_err:
+            print(f"⚠️ Rename error: {rename_err}")
+            # Use original file path
+            preview_filename = os.path.basename(latest_file)
+            final_path = latest_file
+        
+        print(f"✅ SUCCESS: {preview_filename} ({format_bytes(filesize)})")
+        
+        storage.register(preview_filename, filesize, download_id)
+        result_cache.put(cache_key, preview_filename, filesize,
+                         info=status_dict[download_id]['info'],
+                         alias=cache_alias(url, format_selector, target, budget))
+        timer.add('publish', time.perf_counter() - stage_start)
+        JOBS_TOTAL.inc(platform=platform, outcome='complete')
+        DOWNLOAD_BYTES.inc(filesize, platform=platform)
+        TRANSFER_SECONDS.inc(transfer_seconds, platform=platform)
+        link_speeds.observe(platform, filesize, transfer_seconds)
+        
+        status_dict[download_id].update({
+            'progress': 100,
+            'status': 'complete',
+            'success': True,
+            'download_url': f'/download/{preview_filename}',
+            'filename': preview_filename,
+            'filesize': format_bytes(filesize)
+        })
+        return True, preview_filename, status_dict[download_id]['info']
+    
+    def postprocess_stage(deferred, handed_off_at):
+        """🏭 ffmpeg_pool side - the download slot is already serving another job"""
+        timer.add('postprocess_wait', time.perf_counter() - handed_off_at)
+        fetched = tracker.fetched_bytes
+        tracker.stage('postprocess', postprocess_rates.expect(pp_plan['mode'], fetched))
+        try:
+            with ydl_pool.session(platform, pp_opts) as pp_ydl:
+                apply_plan(pp_ydl, pp_plan)
+                stage_start = time.perf_counter()
+                latest_file = run_postprocessors(pp_ydl, deferred)
+                postprocess_rates.observe(pp_plan['mode'], fetched, time.perf_counter() - stage_start)
+            return publish(latest_file)
+        except Exception as e:
+            return fail(e)
+        finally:
+            finish()
+    
+    def follow_leader(flight, cache_key, since):
+        """🛫 Leader's last stage is over - take its file from the cache"""
+        timer.add('coalesced_wait', time.perf_counter() - since)
+        try:
+            cached = result_cache.get(cache_key)
+            if not cached:
+                raise Exception(status_dict.get(flight.owner, {}).get('error') or "Shared download failed")
+            mark_cache_hit(status_dict, download_id, cached)
+            status_dict[download_id]['cache'] = 'coalesced'
+            JOBS_TOTAL.inc(platform=platform, outcome='coalesced')
+            return True, cached['filename'], status_dict[download_id]['info']
+        except Exception as e:
+            return fail(e)
+        finally:
+            finish()
     
     try:
-        # 🛡️ Create temp dir
-        os.makedirs('static/downloads/.temp', exist_ok=True)
+        # 🛡️ Create temp dir - owned by this job until it ends
+        os.makedirs(storage.claim_temp(safe_filename), exist_ok=True)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with ydl_pool.session(platform, ydl_opts) as ydl:
             print("🔍 STEP 1: Extract info...")
+            stage_start = time.perf_counter()
+            
+            # 🧠 Hot URLs reuse metadata - only the download needs fresh format URLs
+            meta = metadata_cache.lookup(canon.key)
+            if meta:
+                print("🧠 METADATA CACHE HIT")
+                info_result = meta.info
+            else:
+                info_result = ydl.extract_info(url, download=False)
+                if not info_result:
+                    raise Exception("No video info found")
+                meta = metadata_cache.put(canon.key, ydl.sanitize_info(info_result))
             
-            info_result = ydl.extract_info(url, download=False)
-            if not info_result:
-                raise Exception("No video info found")
+            title = info_result.get('title') or 'video'
+            uploader = info_result.get('uploader') or info_result.get('channel') or 'user'
+            duration = info_result.get('duration') or 0
+            id_ = info_result.get('id') or 'unknown'
+            timer.add('extract', time.perf_counter() - stage_start)
             
-            title = getattr(info_result, 'title', 'video') or 'video'
-            uploader = getattr(info_result, 'uploader', 'user') or getattr(info_result, 'channel', 'user')
-            duration = getattr(info_result, 'duration', 0) or 0
-            id_ = getattr(info_result, 'id', 'unknown')
+            # 💾 Same media + same settings = same file
+            cache_key = media_cache_key(platform, id_, format_selector, target, budget)
+            cached = result_cache.get(cache_key)
+            if cached:
+                print(f"💾 CACHE HIT: {cached['filename']}")
+                result_cache.add_alias(cache_alias(url, format_selector, target, budget), cache_key)
+                mark_cache_hit(status_dict, download_id, cached)
+                JOBS_TOTAL.inc(platform=platform, outcome='cache_hit')
+                return True, cached['filename'], status_dict[download_id]['info']
+            
+            # 🛫 Same media already downloading under another URL - wait for it
+            flight, is_leader = media_flights.join(cache_key, download_id)
+            if not is_leader:
+                # 🚦 Waiting costs no slot - the leader's finish completes this job
+                print(f"🛫 ATTACHED to {flight.owner}")
+                status_dict[download_id].update({'status': 'waiting', 'attached_to': flight.owner})
+                handed_off = True
+                flight.add_done_callback(lambda _, since=time.perf_counter(): follow_leader(flight, cache_key, since))
+                return None, None, status_dict[download_id].get('info')
+            media_flight_key = cache_key
+            
+            # 💾 Leader may have finished between the cache check and join
+            cached = result_cache.get(cache_key)
+            if cached:
+                mark_cache_hit(status_dict, download_id, cached)
+                return True, cached['filename'], status_dict[download_id]['info']
             
             # 🛡️ Safe filename - Windows
             safe_title = re.sub(r'[<>:"/\\|?*\n\t]', '_', title)[:40]
-            preview_filename = f"{platform}_{safe_title}_{id_}.mp4"
+            preview_filename = f"{platform}_{safe_title}_{id_}.{target}"
             
             print(f"📋 FOUND: {safe_title} ({duration}s)")
             
-            status_dict[download_id].update({
+            tracker.stage('fetch', **{
                 'status': 'downloading',
                 'filename': preview_filename,
                 'info': {
@@ -148,96 +521,183 @@ def bulletproof_social_download(url, status_dict=None, download_id=None):
                     'uploader': uploader[:30],
                     'duration': duration,
                     'platform': platform,
-                    'video_id': id_
+                    'video_id': id_,
+                    'mode': mode
                 }
             })
             
-            print("⬇️ STEP 2: Downloading...")
-            ydl.download([url])
+            if not meta.downloadable():
+                print("🔄 Format URLs expired - re-resolving...")
+                with timer.stage('extract'):
+                    info_result = ydl.extract_info(url, download=False)
+                    meta = metadata_cache.put(canon.key, ydl.sanitize_info(info_result))
             
-            print("🔍 STEP 3: Finding FINAL file...")
+            # 📏 Best rendition under the job's size/time/bitrate budget - pinned for download and resume
+            chosen, estimate, fits = fit_format(ydl, info_result, budget, link_speeds.get(platform))
+            if budget and chosen is not info_result:
+                pin_format(ydl, chosen, format_selector)
+            status_dict[download_id]['info'] = {
+                **status_dict[download_id]['info'],
+                'format_id': chosen.get('format_id'),
+                'resolution': chosen.get('resolution') or chosen.get('format_note'),
+                'estimated_size': format_bytes(estimate) if estimate else '?',
+                'estimated_bytes': estimate,
+                'within_budget': fits,
+            }
+            print(f"📏 Format {chosen.get('format_id')} ~{status_dict[download_id]['info']['estimated_size']}"
+                  + (f" (budget {'ok' if fits else 'exceeded' if fits is False else 'unknown'})" if budget else ''))
+            if fits is False:
+                # 📏 "Up to N MB" is a promise - don't hand back the smallest rendition over it
+                raise Exception(f"📏 No format fits the budget - smallest is ~{format_bytes(estimate)}")
+            if budget and chosen.get('format_id'):
+                # 🛡️ Other budgets pick other renditions - keep their files apart
+                format_tag = re.sub(r'[^\w+-]', '_', chosen['format_id'])
+                preview_filename = f"{platform}_{safe_title}_{id_}_{format_tag}.{target}"
+                status_dict[download_id]['filename'] = preview_filename
             
-            # 🎯 Wait for FFmpeg to finish (Windows file lock)
-            time.sleep(2)
+            # 🎞️ Skip ffmpeg for ready files, stream-copy compatible merges and audio
+            status_dict[download_id]['resume'] = {**resume, 'temp': safe_filename,
+                                                  'format_id': chosen.get('format_id')}
+            pp_plan = plan_postprocessing(chosen, target)
+            apply_plan(ydl, pp_plan)
+            status_dict[download_id]['postprocess'] = pp_plan['mode']
+            print(f"🎞️ Post-processing: {pp_plan['mode']} -> {target}")
+            has_postprocess = pp_plan['mode'] != 'none'
+            tracker.plan(estimate, postprocess_rates.expect(pp_plan['mode'], estimate) if has_postprocess else None,
+                         postprocess=has_postprocess)
             
-            # 🛡️ Find ALL files for this download
-            pattern = f'static/downloads/{safe_filename}_*.mp4'
-            files = glob.glob(pattern)
+            # 📡 Progressive single file - clients can read it while it downloads
+            if not WORKER_MODE and is_streamable(chosen, pp_plan):
+                # Exact size of the pick only - an approximate Content-Length hangs clients
+                live_streams[download_id] = LiveFile(chosen.get('filesize'))
+                status_dict[download_id]['stream_url'] = f'/stream/{download_id}'
             
-            if not files:
-                # 🔍 Check temp folder too
-                temp_pattern = f'static/downloads/.temp/{safe_filename}/**/*.mp4'
-                temp_files = glob.glob(temp_pattern, recursive=True)
-                files.extend(temp_files)
+            print("⬇️ STEP 2: Downloading...")
+            # 🔥 Download from the resolved info - no second extraction. yt-dlp's
+            # post_process call is caught here and run after, inline or on ffmpeg_pool
+            deferred = []
             
-            if not files:
-                # 🔍 Fallback - any recent MP4
-                all_mp4 = glob.glob('static/downloads/*.mp4')
-                if all_mp4:
-                    files = [max(all_mp4, key=os.path.getmtime)]
+            def defer_postprocess(filename, info, files_to_move=None):
+                # Copy - yt-dlp strips the keys it shares with the parent info once process_info returns
+                deferred.append((filename, dict(info), files_to_move))
+                info['filepath'] = filename
+                return info
             
-            if not files:
-                raise Exception("No MP4 files created")
+            # 🎛️ Fragment threads, retries and timeout from the platform's recent fetches
+            lease = fetch_tuner.lease(platform, is_fragmented(chosen))
+            YDLPool.update_params(ydl, lease.params)
+            status_dict[download_id]['fetch_tuning'] = {
+                'fragments': lease.fragments, 'retries': lease.retries, 'timeout': lease.timeout}
             
-            # 🎯 Latest LARGEST file
-            latest_file = max(files, key=lambda f: (os.path.getmtime(f), os.path.getsize(f)))
-            filesize = os.path.getsize(latest_file)
+            ydl.post_process = defer_postprocess
+            stage_start = time.perf_counter()
+            try:
+                ydl.process_ie_result(info_result, download=True)
+            finally:
+                lease.close(bool(deferred))
+            del ydl.post_process
+            transfer_seconds = time.perf_counter() - stage_start
+            timer.add('download', transfer_seconds)
+            if not deferred:
+                raise Exception("No output file reported by yt-dlp")
             
-            print(f"📁 Latest file: {os.path.basename(latest_file)} ({format_bytes(filesize)})")
+            if needs_ffmpeg(ydl, deferred):
+                # 🏭 Free this slot for the next download - waits only if the ffmpeg backlog is full
+                tracker.stage('postprocess_queued', status='processing')
+                handed_off = True
+                position = ffmpeg_pool.submit(download_id, postprocess_stage, deferred, time.perf_counter())
+                print(f"🏭 STEP 3: Queued for ffmpeg (#{position}, {pp_plan['mode']})")
+                return None, preview_filename, status_dict[download_id]['info']
             
-            # 🛡️ Windows file unlock + rename
-            if filesize > 500:
-                final_path = f'static/downloads/{preview_filename}'
-                
-                # 🔑 SAFE RENAME - Windows friendly
-                try:
-                    if latest_file != final_path:
-                        # Wait for file lock release (browser/video preview)
-                        for attempt in range(10):
-                            try:
-                                os.rename(latest_file, final_path)
-                                latest_file = final_path
-                                break
-                            except PermissionError:
-                                print(f"⏳ Rename attempt {attempt+1}/10...")
-                                time.sleep(0.5)
-                        
-                        if os.path.exists(final_path):
-                            latest_file = final_path
-                        else:
-                            print("⚠️ Rename failed - using original")
-                
-                except Exception as rename_err:
-                    print(f"⚠️ Rename error: {rename_err}")
-                    # Use original file path
-                    preview_filename = os.path.basename(latest_file)
-                    final_path = latest_file
-                
-                print(f"✅ SUCCESS: {preview_filename} ({format_bytes(filesize)})")
-                
-                status_dict[download_id].update({
-                    'progress': 100,
-                    'status': 'complete',
-                    'success': True,
-                    'download_url': f'/download/{preview_filename}',
-                    'filename': preview_filename,
-                    'filesize': format_bytes(filesize)
-                })
-                return True, preview_filename, status_dict[download_id]['info']
-            else:
-                raise Exception(f"File too small: {filesize} bytes")
+            print("🔍 STEP 3: Final file from yt-dlp...")
+            latest_file = run_postprocessors(ydl, deferred)
+        return publish(latest_file)
                 
     except Exception as e:
-        error_msg = str(e)
-        print(f"💥 ERROR: {error_msg}")
-        print(f"Traceback: {traceback.format_exc()}")
-        
-        status_dict[download_id].update({
-            'progress': 0,
-            'status': 'error',
-            'error': error_msg[:100]
-        })
-        return False, None, error_msg
+        return fail(e)
+    finally:
+        if not handed_off:
+            finish()
+
+def publish_queue_positions():
+    """🚦 Copy queue position and estimated wait into queued job records"""
+    for job_id, position, eta in (job_queue or scheduler).queue_positions():
+        record = download_status.get(job_id)
+        if record is not None and record.get('queue_position') != position:
+            record.update({'queue_position': position, 'queue_eta': eta})
+
+def run_download_job(url, status_dict, download_id, flight_key, mode='video', budget=None):
+    """🛫 Run a leader job - everyone attached to it is released when its last stage ends"""
+    status_dict[download_id].update({'status': 'starting', 'queue_position': 0, 'queue_eta': 0})
+    try:
+        return bulletproof_social_download(url, status_dict, download_id, mode, budget,
+                                           on_finish=lambda: url_flights.finish(flight_key))
+    except Exception:
+        url_flights.finish(flight_key)  # failed before the job took ownership of on_finish
+        raise
+
+def run_queued_job(download_id, payload, on_finish=None):
+    """⚙️ Worker-process side of a job taken from the SQLite queue - ``on_finish`` once it fully ends"""
+    record = download_status.adopt(download_id)
+    record.pop('error', None)  # ♻️ A requeued claim may have been marked interrupted meanwhile
+    record.update({'status': 'starting', 'queue_position': 0, 'queue_eta': 0})
+    return bulletproof_social_download(payload['url'], download_status, download_id,
+                                       payload.get('mode', 'video'), payload.get('budget'), on_finish)
+
+def enqueue_job(download_id, url, platform, alias, priority='normal', mode='video', budget=None):
+    """🚦 Queue a job - returns the id of the job that will actually run it
+
+    A different id means the same URL is already queued or running and
+    the caller should attach to it. Raises QueueFull when saturated.
+    """
+    if job_queue is not None:
+        leader = job_queue.put(download_id, {'url': url, 'mode': mode, 'budget': budget},
+                               platform, priority, dedupe_key=alias)
+        publish_queue_positions()
+        return leader
+    flight, is_leader = url_flights.join(alias, download_id)
+    if not is_leader:
+        return flight.owner
+    try:
+        scheduler.submit(download_id, platform, run_download_job,
+                         url, download_status, download_id, alias, mode, budget, priority=priority)
+    except QueueFull:
+        url_flights.finish(alias)
+        raise
+    return download_id
+
+def resume_interrupted_jobs():
+    """♻️ Re-queue jobs a crash or restart cut off - their temp dirs still hold the partial data
+
+    Needs JOB_STORE_PATH (in-memory records die with the process). In
+    worker mode the queue itself is durable and worker.py releases the
+    claims of dead workers, so there is nothing to do here.
+    """
+    if WORKER_MODE:
+        return 0
+    resumed = 0
+    for job_id, record in download_status.unfinished():
+        url = record.get('url')
+        if not url or record.get('batch'):
+            continue
+        mode = record.get('mode', 'video')
+        budget = record.get('budget')
+        platform = detect_platform(url)
+        record.pop('error', None)
+        record.update({'status': 'queued', 'created': time.time()})
+        download_status[job_id] = record
+        try:
+            # Users already waited once - resumed work goes ahead of new jobs
+            alias = cache_alias(url, *job_format(platform, mode), budget)
+            leader = enqueue_job(job_id, url, platform, alias, 'high', mode, budget)
+        except QueueFull:
+            record.update({'status': 'error', 'progress': 0, 'error': 'Job interrupted - please retry'})
+            continue
+        if leader != job_id:
+            download_status.alias(job_id, leader)
+        resumed += 1
+        print(f"♻️ Re-queued interrupted job {job_id}")
+    return resumed
 
 @app.route('/')
 def index():
@@ -256,7 +716,7 @@ def index():
             .container { background: white; padding: 30px; border-radius: 16px; box-shadow: 0 4px 20px rgba(0,0,0,0.1); }
             h1 { text-align: center; color: #1a1a1a; margin-bottom: 10px; }
             .subtitle { text-align: center; color: #666; margin-bottom: 30px; }
-            input[type="url"] { 
+            input[type="url"], select { 
                 width: 100%; padding: 16px; font-size: 16px; border: 2px solid #e1e5e9; 
                 border-radius: 12px; margin-bottom: 16px; transition: border-color 0.2s;
             }
@@ -304,6 +764,18 @@ def index():
             
             <form id="downloadForm">
                 <input type="url" id="url" placeholder="Enter a URL to Download" required>
+                <select id="mode">
+                    <option value="video">🎬 Video (MP4)</option>
+                    <option value="mp3">🎵 Audio only - MP3</option>
+                    <option value="m4a">🎵 Audio only - M4A</option>
+                    <option value="opus">🎵 Audio only - Opus</option>
+                </select>
+                <select id="maxSize">
+                    <option value="">📏 Best quality</option>
+                    <option value="25M">📏 Up to 25 MB</option>
+                    <option value="50M">📏 Up to 50 MB</option>
+                    <option value="100M">📏 Up to 100 MB</option>
+                </select>
                 <button type="submit" id="downloadBtn">🚀 Download HD Video</button>
             </form>
             
@@ -321,6 +793,7 @@ def index():
                 </div>
                 <div id="statusText" style="margin-top: 8px; font-weight: 500;"></div>
                 <div id="speedInfo" class="speed-info" style="display:none;"></div>
+                <a id="streamLink" class="download-btn" style="display:none;" download>⚡ Save while downloading</a>
             </div>
             
             <div id="result" style="display:none;"></div>
@@ -350,6 +823,8 @@ def index():
                 try {
                     const formData = new FormData();
                     formData.append('url', urlInput.value.trim());
+                    formData.append('mode', document.getElementById('mode').value);
+                    formData.append('max_size', document.getElementById('maxSize').value);
                     
                     const response = await fetch('/download', {
                         method: 'POST',
@@ -358,7 +833,7 @@ def index():
                     const data = await response.json();
                     
                     if (data.success) {
-                        pollStatus(data.download_id);
+                        watchStatus(data.download_id);
                     } else {
                         throw new Error(data.error || 'Start failed');
                     }
@@ -370,36 +845,73 @@ def index():
                 }
             };
             
+            function watchStatus(downloadId) {
+                // 🔴 Pushed progress - fall back to polling if SSE is unavailable
+                if (!window.EventSource) return pollStatus(downloadId);
+                const status = {};
+                const source = new EventSource(`/events?ids=${encodeURIComponent(downloadId)}`);
+                source.addEventListener('progress', (e) => {
+                    Object.assign(status, JSON.parse(e.data));
+                    if (renderStatus(status)) source.close();
+                });
+                source.addEventListener('done', () => source.close());
+                source.onerror = () => {
+                    source.close();
+                    pollStatus(downloadId);
+                };
+            }
+
+            function renderStatus(status) {
+                const progressBar = document.getElementById('progressBar');
+                const statusText = document.getElementById('statusText');
+                const speedInfo = document.getElementById('speedInfo');
+
+                progressBar.style.width = status.progress + '%';
+                statusText.textContent = `${status.progress}% ${status.status}`;
+                if (status.status === 'queued' && status.queue_position) {
+                    statusText.textContent = `⏳ Queued #${status.queue_position} • ~${status.queue_eta}s`;
+                }
+                if (status.status === 'processing') {
+                    statusText.textContent = status.stage === 'postprocess_queued' ? '🎞️ Waiting for ffmpeg...' : '🎞️ Converting...';
+                }
+
+                if (status.downloaded && status.total) {
+                    speedInfo.textContent = `${status.downloaded} / ${status.total}${status.speed ? ` • ${status.speed}` : ''}${status.eta ? ` • ETA ${status.eta}` : ''}`;
+                    speedInfo.style.display = 'block';
+                }
+
+                const streamLink = document.getElementById('streamLink');
+                if (status.stream_url && status.status !== 'complete') {
+                    streamLink.href = status.stream_url;
+                    streamLink.style.display = 'block';
+                } else {
+                    streamLink.style.display = 'none';
+                }
+
+                if (status.status === 'complete' && status.success) {
+                    showResult(status);
+                    return true;
+                } else if (status.status === 'error') {
+                    statusText.textContent = `❌ ${status.error || 'Download failed'}`;
+                    document.getElementById('status').className = 'status error';
+                    document.getElementById('downloadBtn').disabled = false;
+                    document.getElementById('downloadBtn').textContent = '🚀 Download HD Video';
+                    return true;
+                }
+                return false;
+            }
+
             async function pollStatus(downloadId) {
                 try {
                     const response = await fetch(`/status/${downloadId}`);
                     const status = await response.json();
-                    
-                    const progressBar = document.getElementById('progressBar');
-                    const statusText = document.getElementById('statusText');
-                    const speedInfo = document.getElementById('speedInfo');
-                    
-                    progressBar.style.width = status.progress + '%';
-                    statusText.textContent = `${status.progress}% ${status.status}`;
-                    
-                    if (status.downloaded && status.total) {
-                        speedInfo.textContent = `${status.downloaded} / ${status.total} • ${status.speed}`;
-                        speedInfo.style.display = 'block';
-                    }
-                    
-                    if (status.status === 'complete' && status.success) {
-                        showResult(status);
-                        clearInterval(pollInterval);
-                    } else if (status.status === 'error') {
-                        statusText.textContent = `❌ ${status.error || 'Download failed'}`;
-                        document.getElementById('status').className = 'status error';
-                        document.getElementById('downloadBtn').disabled = false;
-                        document.getElementById('downloadBtn').textContent = '🚀 Download HD Video';
+
+                    if (renderStatus(status)) {
                         clearInterval(pollInterval);
                     } else {
                         pollInterval = setTimeout(() => pollStatus(downloadId), 800);
                     }
-                } catch(e) {
+                } catch (e) {
                     console.error('Poll error:', e);
                     clearInterval(pollInterval);
                 }
@@ -408,10 +920,14 @@ def index():
             function showResult(status) {
                 const resultDiv = document.getElementById('result');
                 const info = status.info;
+                const isVideo = status.filename.endsWith('.mp4');
+                const preview = isVideo
+                    ? `<video class="video-preview" controls preload="metadata"><source src="${status.download_url}" type="video/mp4"></video>`
+                    : `<audio style="width:100%; margin: 20px 0;" controls preload="metadata" src="${status.download_url}"></audio>`;
                 
                 resultDiv.innerHTML = `
                     <div class="status success">
-                        <h3>✅ Video Downloaded!</h3>
+                        <h3>✅ ${isVideo ? 'Video' : 'Audio'} Downloaded!</h3>
                         <div class="info-grid">
                             <div class="info-item">
                                 <strong>${status.filename}</strong><br>
@@ -422,9 +938,7 @@ def index():
                             #     <small>${info.duration}s</small>
                             # </div>
                         </div>
-                        <video class="video-preview" controls preload="metadata">
-                            <source src="${status.download_url}" type="video/mp4">
-                        </video>
+                        ${preview}
                         <a href="${status.download_url}" class="download-btn" download>💾 Save to Downloads</a>
                     </div>
                 `;
@@ -438,6 +952,57 @@ def index():
     </html>
     '''
 
+def create_job(url, priority='normal', mode='video', budget=None):
+    """🎬 Start (or reuse) a download job for ``url``
+
+    Returns the job's status fields for the response: a cache hit is
+    complete at once, a URL that is already running is attached to its
+    leader. Raises QueueFull when the scheduler is saturated.
+    """
+    canon = canonicalize(url)
+    download_id = f"dl_{int(time.time()*1000)}_{uuid.uuid4().hex[:6]}"
+    download_status[download_id] = StatusRecord({
+        'progress': 0, 'status': 'starting', 'downloaded_bytes': 0,
+        'total_bytes': None, 'speed_bps': None, 'url': url, 'mode': mode, 'budget': budget, 'created': time.time()
+    })
+    
+    # 💾 Repeat URL (in any form) - hand back the finished file without any work
+    platform = canon.platform
+    format_selector, target = job_format(platform, mode)
+    alias = cache_alias(url, format_selector, target, budget)
+    cached = result_cache.lookup_alias(alias)
+    if not cached and canon.media_id:
+        # 🔑 Same id as the extractor's for these URL forms - no alias needed
+        media_key = media_cache_key(platform, canon.media_id, format_selector, target, budget)
+        cached = result_cache.get(media_key)
+        if cached:
+            result_cache.add_alias(alias, media_key)
+    if cached:
+        mark_cache_hit(download_status, download_id, cached)
+        return {'download_id': download_id, 'cache': 'hit',
+                'download_url': download_status[download_id]['download_url']}
+    
+    download_status[download_id]['status'] = 'queued'
+    try:
+        leader = enqueue_job(download_id, url, platform, alias, priority, mode, budget)
+    except QueueFull:
+        download_status.pop(download_id, None)
+        raise
+    
+    # 🛫 Same URL already running - share its status record and final file
+    if leader != download_id:
+        download_status.alias(download_id, leader)
+        return {'download_id': download_id, 'coalesced': True}
+    return {'download_id': download_id}
+
+def busy_response(e):
+    """🚦 Saturated - tell the client when to come back instead of queueing forever"""
+    response = jsonify({'success': False, 'error': '🚦 Server busy - try again shortly',
+                        'retry_after': e.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 @app.route('/download', methods=['POST'])
 def start_download():
     """Start download job"""
@@ -445,46 +1010,168 @@ def start_download():
     url = data['url'].strip()
     
     if not re.match(r'^https?://', url):
-        return jsonify({'success': False, 'error': '🔗 Valid HTTPS URL required'})
+        return jsonify({'success': False, 'error': '🔗 Valid HTTPS URL required'}), 400
     
-    download_id = f"dl_{int(time.time()*1000)}"
-    download_status[download_id] = {
-        'progress': 0, 'status': 'starting', 'speed': '', 
-        'downloaded': '0 B', 'total': '?', 'url': url
-    }
+    # 🎵 video (mp4) or audio only: mp3 / m4a / opus
+    mode = data.get('mode', 'video')
+    if mode not in OUTPUT_MODES:
+        return jsonify({'success': False, 'error': f"🎵 Mode must be one of: {', '.join(OUTPUT_MODES)}"}), 400
     
-    executor.submit(bulletproof_social_download, url, download_status, download_id)
-    return jsonify({'success': True, 'download_id': download_id})
+    # 📏 Optional budget: max_size ('50M'), max_time (seconds at measured speed), max_bitrate (kbit/s)
+    try:
+        budget = job_budget(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f"📏 {e}"}), 400
+    
+    try:
+        job = create_job(url, job_priority(data, request.headers), mode, budget)
+    except QueueFull as e:
+        return busy_response(e)
+    return jsonify({'success': True, **job})
+
+def run_batch_job(batch_id, urls, mode='video', budget=None):
+    """🧺 Resolve playlist entries, then fan the batch out over the normal job queue"""
+    try:
+        if len(urls) == 1:
+            download_status[batch_id]['status'] = 'resolving'
+            platform = detect_platform(urls[0])
+            headers = {'User-Agent': INSTAGRAM_FB_UA} if platform in ['Instagram', 'Facebook'] else None
+            urls = resolve_entries(urls[0], BATCH_MAX_ITEMS, headers)
+        # 🔑 Same media under different URL forms is fetched once
+        urls = dedupe_urls(urls)
+        download_status[batch_id].update({'status': 'running', 'total_items': len(urls)})
+        run_batch(batch_id, urls, download_status, lambda u: create_job(u, 'low', mode, budget)['download_id'],
+                  parallelism=BATCH_PARALLELISM)
+    except Exception as e:
+        print(f"💥 BATCH ERROR: {e}")
+        download_status[batch_id].update({'status': 'error', 'progress': 0, 'error': str(e)[:100]})
+
+@app.route('/batch', methods=['POST'])
+def start_batch():
+    """🧺 Many URLs (one per line) or a single playlist URL"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        payload = {}
+    urls = payload.get('urls') or request.form.get('urls', '')
+    if isinstance(urls, str):
+        urls = urls.split()
+    # 🛡️ JSON bodies can carry anything - only a list of strings is a URL list
+    if not isinstance(urls, list) or not all(isinstance(u, str) for u in urls):
+        return jsonify({'success': False, 'error': '🔗 urls must be a list of URL strings'}), 400
+    urls = [u.strip() for u in urls if re.match(r'^https?://', u.strip())][:BATCH_MAX_ITEMS]
+    if not urls:
+        return jsonify({'success': False, 'error': '🔗 At least one valid URL required'}), 400
+    mode = payload.get('mode') or request.form.get('mode', 'video')
+    if not isinstance(mode, str) or mode not in OUTPUT_MODES:
+        return jsonify({'success': False, 'error': f"🎵 Mode must be one of: {', '.join(OUTPUT_MODES)}"}), 400
+    try:
+        budget = job_budget(payload or request.form)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f"📏 {e}"}), 400
+    
+    batch_id = f"batch_{int(time.time()*1000)}_{uuid.uuid4().hex[:6]}"
+    download_status[batch_id] = StatusRecord({
+        'progress': 0, 'status': 'starting', 'batch': True, 'total_items': len(urls), 'items': []
+    })
+    try:
+        batch_pool.offer(batch_id, run_batch_job, batch_id, urls, mode, budget)
+    except QueueFull as e:
+        download_status.pop(batch_id, None)
+        return busy_response(e)
+    return jsonify({'success': True, 'batch_id': batch_id,
+                    'zip_url': f'/batch/{batch_id}/zip', 'status_url': f'/status/{batch_id}'})
+
+@app.route('/batch/<batch_id>/zip')
+def batch_zip(batch_id):
+    """📦 ZIP of the batch, streamed as items finish - entries are stored, not recompressed"""
+    if not (download_status.get(batch_id) or {}).get('batch'):
+        return jsonify({'error': 'Unknown batch'}), 404
+    files = ready_batch_files(batch_id, download_status, 'static/downloads')
+    response = Response(stream_with_context(stream_zip(files)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{batch_id}.zip"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/status/<download_id>')
 def status(download_id):
     """Get download status"""
     status_data = download_status.get(download_id, {'status': 'expired', 'progress': 0})
-    return jsonify(status_data)
+    return jsonify(present(status_data))
+
+@app.route('/events')
+def events():
+    """🔴 Push progress for one or more jobs (?ids=a,b) over Server-Sent Events"""
+    ids = [i for i in request.args.get('ids', '').split(',') if i][:50]
+    if not ids:
+        return jsonify({'error': 'ids required'}), 400
+    # ⚙️ Worker processes can't wake this process - poll the shared store instead
+    poll = 0.5 if WORKER_MODE else None
+    response = Response(stream_with_context(stream_progress(download_status, ids, poll_interval=poll)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/stream/<download_id>')
+def stream_download(download_id):
+    """📡 Pipe a progressive download to the client while it is still arriving"""
+    status_data = download_status.get(download_id, {})
+    live = live_streams.get(download_id)
+    if live is None:
+        if status_data.get('download_url'):
+            return redirect(status_data['download_url'])
+        return jsonify({'error': 'Not streamable - wait for the download to finish',
+                        'status': status_data.get('status', 'expired')}), 409
+    
+    live.wait_for_path(30)
+    filename = status_data.get('filename') or f'{download_id}.mp4'
+    headers = {
+        'Content-Disposition': content_disposition(filename),
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    }
+    if live.total:
+        headers['Content-Length'] = str(live.total)
+    print(f"📡 Streaming live: {filename}")
+    return Response(stream_with_context(live.tail()), headers=headers,
+                    content_type=content_type_for(filename), direct_passthrough=True)
 
 @app.route('/download/<path:filename>')
 def serve_file(filename):
-    """Serve downloaded file"""
-    filepath = os.path.join('static/downloads', filename)
+    """Serve downloaded file - Range/ETag aware"""
+    filepath = safe_join('static/downloads', filename)
     
-    if not os.path.exists(filepath):
-        print(f"❌ File missing: {filepath}")
+    # 🛡️ Never hand out the cache index or .temp work files
+    if not filepath or any(part.startswith('.') for part in filename.split('/')) or not os.path.isfile(filepath):
+        print(f"❌ File missing: {filename}")
         return jsonify({'error': 'File not ready - refresh page'}), 404
     
-    filesize = os.path.getsize(filepath)
-    print(f"✅ Serving: {filename} ({format_bytes(filesize)})")
-    
-    response = send_from_directory('static/downloads', filename, as_attachment=True)
-    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-    response.headers['Content-Type'] = 'video/mp4'
-    response.headers['Cache-Control'] = 'public, max-age=3600'
+    print(f"✅ Serving: {filename} {request.headers.get('Range', '')}")
+    # 🧹 Pinned while the response is open - quota eviction skips it
+    started = time.perf_counter()
+    response = send_media(request, filepath)
+    response.call_on_close(storage.pin(filename))
+    SERVE_SECONDS.observe(time.perf_counter() - started, status=response.status_code)
+    SERVE_BYTES.inc(int(response.headers.get('Content-Length', 0)), status=response.status_code)
     return response
 
+@app.route('/metrics')
+def metrics():
+    """📊 Prometheus text metrics - worker processes are merged in from METRICS_DIR"""
+    extra = registry.load_dumps(METRICS_DIR) if WORKER_MODE else ()
+    return Response(registry.render(extra), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
-    # 🧹 Initial cleanup
-    temp_cleanup()
+    debug = os.environ.get('FLASK_DEBUG', '1') == '1'
+    # 🔁 With debug on, the reloader parent only watches files - jobs resume in the serving child
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # 🧹 Initial cleanup - partial downloads of unfinished jobs are kept and resumed
+        temp_cleanup()
+        resume_interrupted_jobs()
     print("🔥 BULLETPROOF Social Downloader v4.3")
     print("✅ FFmpeg FIXED - NO 'when' parameter")
     print("✅ Instagram/YouTube/TikTok/Facebook/X")
     print("🌐 http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    if WORKER_MODE:
+        print(f"⚙️ Worker mode - start workers with: python worker.py (queue: {WORKER_QUEUE_PATH})")
+    app.run(debug=debug, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,171 @@
+import io
+import os
+import time
+import zipfile
+
+import yt_dlp
+
+from progress import TERMINAL_STATES, present
+from scheduler import QueueFull
+
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+
+def resolve_entries(url, max_items, http_headers=None):
+    """📃 Expand a playlist URL into entry URLs with one flat extraction
+
+    Returns ``[url]`` unchanged when the URL is a single video.
+    """
+    opts = {'extract_flat': 'in_playlist', 'quiet': True, 'no_warnings': True, 'playlistend': max_items}
+    if http_headers:
+        opts['http_headers'] = http_headers
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if not info or info.get('_type') not in ('playlist', 'multi_video'):
+        return [url]
+    urls = []
+    for entry in info.get('entries') or []:
+        entry_url = entry and (entry.get('webpage_url') or entry.get('url'))
+        if entry_url and entry_url.startswith('http'):
+            urls.append(entry_url)
+    return urls[:max_items]
+
+
+def run_batch(batch_id, urls, status_dict, create_job, parallelism=3, poll_interval=0.5):
+    """🧺 Fan a batch out over the job queue, at most ``parallelism`` items at once
+
+    ``create_job(url)`` starts (or reuses) a normal download job and returns
+    its id; it may raise ``QueueFull``, in which case the item is retried.
+    The batch record gets aggregate and per-item progress on every pass.
+    """
+    batch = status_dict[batch_id]
+    pending = list(urls)
+    items = []
+    while pending or any(_item_state(status_dict, i['id']) not in TERMINAL_STATES for i in items):
+        active = sum(1 for i in items if _item_state(status_dict, i['id']) not in TERMINAL_STATES)
+        while pending and active < parallelism:
+            try:
+                item_id = create_job(pending[0])
+            except QueueFull as e:
+                time.sleep(min(e.retry_after, 5))
+                break
+            items.append({'id': item_id, 'url': pending.pop(0)})
+            active += 1
+        _publish(batch, status_dict, items, len(urls))
+        time.sleep(poll_interval)
+    _publish(batch, status_dict, items, len(urls), finished=True)
+
+
+def _item_state(status_dict, item_id):
+    return (status_dict.get(item_id) or {}).get('status', 'expired')
+
+
+def _publish(batch, status_dict, items, total, finished=False):
+    summary = []
+    done = failed = 0
+    progress_sum = 0
+    for item in items:
+        record = present(status_dict.get(item['id']) or {'status': 'expired', 'progress': 0})
+        state = record.get('status')
+        if state == 'complete':
+            done += 1
+        elif state in TERMINAL_STATES:
+            failed += 1
+        progress_sum += 100 if state in TERMINAL_STATES else record.get('progress', 0)
+        summary.append({'id': item['id'], 'status': state, 'progress': record.get('progress', 0),
+                        'filename': record.get('filename'), 'download_url': record.get('download_url'),
+                        'error': record.get('error')})
+    fields = {
+        'items': summary,
+        'total_items': total,
+        'completed': done,
+        'failed': failed,
+        'progress': int(progress_sum / total) if total else 100,
+    }
+    if finished:
+        ok = done > 0 or total == 0
+        fields.update({'status': 'complete' if ok else 'error', 'success': ok, 'progress': 100})
+        if not ok:
+            fields['error'] = 'Every item failed'
+    batch.update(fields)
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only buffer zipfile streams into - drained after every write burst"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return b''.join(chunks)
+
+
+def stream_zip(ready_files):
+    """📦 Build a ZIP on the fly from ``(arcname, path)`` pairs as they arrive
+
+    Entries are STORED (video is already compressed) with data descriptors,
+    so nothing is buffered beyond one chunk and no seeking is needed.
+    """
+    sink = _ZipSink()
+    seen = set()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for arcname, path in ready_files:
+            base, ext = os.path.splitext(arcname)
+            n = 1
+            while arcname in seen:
+                arcname = f'{base} ({n}){ext}'
+                n += 1
+            seen.add(arcname)
+            info = zipfile.ZipInfo(arcname, date_time=time.localtime(os.path.getmtime(path))[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, 'rb') as src, zf.open(info, 'w', force_zip64=True) as dst:
+                while True:
+                    chunk = src.read(ZIP_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def ready_batch_files(batch_id, status_dict, root, poll_interval=0.5, timeout=6 * 3600):
+    """Yield ``(arcname, path)`` for batch items in completion order until all finish"""
+    sent = set()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        batch = status_dict.get(batch_id) or {}
+        # Read before the scan - every yield pauses here while earlier files stream, so only a
+        # scan that started after the batch finished is known to have seen every item
+        finished = batch.get('status') in TERMINAL_STATES
+        missing = []
+        for item in batch.get('items', []):
+            if item['id'] in sent or item['status'] != 'complete' or not item.get('filename'):
+                continue
+            path = os.path.join(root, item['filename'])
+            if not os.path.isfile(path):
+                missing.append(item['filename'])
+                continue
+            yield item['filename'], path
+            sent.add(item['id'])
+        if finished:
+            for filename in missing:
+                print(f"⚠️ ZIP {batch_id}: skipped {filename} - file is gone")
+            return
+        time.sleep(poll_interval)
+    print(f"⚠️ ZIP {batch_id}: timed out before the batch finished")
+
@@ -0,0 +1,425 @@
+"""🏁 Offline benchmark - no Instagram/YouTube needed
+
+Starts a local fake-media server, registers a stub yt-dlp extractor for it
+and drives the real Flask app over HTTP:
+
+    python benchmark.py                                  # defaults
+    python benchmark.py --jobs 200 -c 16 --size 20MB --kind fragmented
+    python benchmark.py --json out.json                  # save results
+    python benchmark.py --baseline out.json --tolerance 0.2   # exit 1 on regression
+
+Phases: ``jobs`` (POST /download then poll /status until done),
+``status`` (GET /status only) and ``serve`` (GET /download/<file>).
+Each reports throughput, p50/p99 latency, CPU and memory. The app, the
+fake server and the client share this process, so CPU includes all three -
+compare runs against each other, not against production numbers.
+The app runs in a scratch directory so real downloads and caches are untouched.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, quote, urlencode, urlparse
+from urllib.request import Request, urlopen
+
+from yt_dlp.extractor.common import InfoExtractor
+
+BLOCK = random.Random(0).randbytes(1024 * 1024)  # repeated to build any size
+
+
+# --- fake media server ------------------------------------------------------
+class FakeMediaHandler(BaseHTTPRequestHandler):
+    """🎞️ Synthetic media: progressive MP4s, DASH-style fragments and a JSON 'API'
+
+    ``/api/<id>?size=&kind=&frags=`` returns the formats (video plus a 1/10 size m4a audio track) the stub extractor
+    hands to yt-dlp; ``/media/<id>.mp4?size=`` and ``/frag/<id>/<n>.m4s?size=``
+    return bytes. ``server.latency`` delays API responses (extraction cost),
+    ``server.frag_latency`` every fragment (round trip to a CDN edge).
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        if parsed.path.startswith('/api/'):
+            time.sleep(self.server.latency)
+            body = json.dumps(self.server.info(parsed.path[5:], query)).encode()
+            self._send(200, body, 'application/json')
+        elif parsed.path.startswith(('/media/', '/frag/')):
+            if parsed.path.startswith('/frag/'):
+                time.sleep(self.server.frag_latency)
+            self._send_bytes(int(query.get('size', 1024 * 1024)))
+        else:
+            self._send(404, b'not found', 'text/plain')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_bytes(self, size):
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+        if match and size:
+            start = int(match.group(1) or 0)
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        pos = start
+        while pos <= end:
+            offset = pos % len(BLOCK)
+            chunk = BLOCK[offset:offset + min(len(BLOCK) - offset, end - pos + 1)]
+            self.wfile.write(chunk)
+            pos += len(chunk)
+
+
+class FakeMediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, frag_latency=0.0):
+        super().__init__(('127.0.0.1', 0), FakeMediaHandler)
+        self.latency = latency
+        self.frag_latency = frag_latency
+        self.base = f'http://127.0.0.1:{self.server_address[1]}'
+
+    def page_url(self, video_id, size, kind='progressive', frags=10):
+        return f'{self.base}/bench/{video_id}?' + urlencode({'size': size, 'kind': kind, 'frags': frags})
+
+    def info(self, video_id, query):
+        size = int(query.get('size', 1024 * 1024))
+        common = {'ext': 'mp4', 'vcodec': 'avc1.64001f', 'acodec': 'mp4a.40.2',
+                  'width': 1280, 'height': 720, 'filesize': size}
+        if query.get('kind') == 'fragmented':
+            frags = max(int(query.get('frags', 10)), 1)
+            frag_size = -(-size // frags)
+            fmt = {**common, 'format_id': 'dash', 'protocol': 'http_dash_segments',
+                   'url': f'{self.base}/frag/{video_id}/', 'container': 'mp4_dash',
+                   'fragment_base_url': f'{self.base}/frag/{video_id}/',
+                   'fragments': [{'path': f'{n}.m4s?size={frag_size}'} for n in range(frags)]}
+        else:
+            fmt = {**common, 'format_id': 'mp4', 'url': f'{self.base}/media/{video_id}.mp4?size={size}'}
+        audio_size = max(size // 10, 1024)
+        audio = {'format_id': 'audio', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 128,
+                 'filesize': audio_size, 'url': f'{self.base}/media/{video_id}.m4a?size={audio_size}'}
+        return {'id': video_id, 'title': f'bench {video_id}', 'duration': 60, 'formats': [audio, fmt]}
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-media', daemon=True).start()
+        return self
+
+
+class BenchIE(InfoExtractor):
+    """Stub extractor for FakeMediaServer pages - one JSON request, like a real API extractor"""
+    _VALID_URL = r'https?://127\.0\.0\.1:\d+/bench/(?P<id>[\w-]+)'
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        return self._download_json(url.replace('/bench/', '/api/', 1), video_id)
+
+
+def register_stub_extractor():
+    """Put BenchIE first in yt-dlp's extractor table - every new YoutubeDL picks it up"""
+    from yt_dlp.extractor import import_extractors
+    from yt_dlp.globals import extractors
+    import_extractors()
+    table = {'BenchIE': BenchIE, **extractors.value}
+    extractors.value.clear()
+    extractors.value.update(table)
+
+
+# --- measurement ------------------------------------------------------------
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def _rusage():
+    """getrusage() where the platform has it - None on Windows, CPU/RSS stats are skipped"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF)
+
+
+def cpu_seconds():
+    usage = _rusage()
+    return usage.ru_utime + usage.ru_stime if usage else None
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    usage = _rusage()
+    return usage.ru_maxrss * 1024 if usage else None
+
+
+class Phase:
+    """⏱️ Wall time, CPU time and latencies for one benchmark phase"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.cpu_start = cpu_seconds()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self.started
+        cpu = cpu_seconds()
+        self.cpu = cpu - self.cpu_start if cpu is not None else None
+        self.rss = rss_bytes()
+
+    def record(self, seconds, nbytes=0, ok=True):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.bytes += nbytes
+            self.errors += 0 if ok else 1
+
+    def result(self):
+        ok = len(self.latencies) - self.errors
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'wall_s': round(self.wall, 3),
+            'throughput_per_s': round(ok / self.wall, 2) if self.wall else 0,
+            'mb_per_s': round(self.bytes / self.wall / 1024 ** 2, 2) if self.wall else 0,
+            'p50_ms': round(percentile(self.latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(self.latencies, 99) * 1000, 2),
+            'cpu_s': round(self.cpu, 3) if self.cpu is not None else None,
+            'cpu_pct': round(100 * self.cpu / self.wall, 1) if self.cpu is not None and self.wall else None,
+            'rss_mb': round(self.rss / 1024 ** 2, 1) if self.rss is not None else None,
+        }
+
+
+# --- phases -----------------------------------------------------------------
+def fetch(url, data=None, headers=None):
+    """``(status, headers, body_length, json_or_None)`` - the body is read in 1 MiB chunks"""
+    req = Request(url, data=urlencode(data).encode() if data else None, headers=headers or {})
+    try:
+        resp = urlopen(req, timeout=600)
+    except HTTPError as e:
+        resp = e
+    with resp:
+        if 'json' in resp.headers.get('Content-Type', ''):
+            body = resp.read()
+            return resp.status, resp.headers, len(body), json.loads(body)
+        length = 0
+        while True:
+            chunk = resp.read(1024 * 1024)
+            if not chunk:
+                break
+            length += len(chunk)
+        return resp.status, resp.headers, length, None
+
+
+def run_jobs(base, media, args, status_phase):
+    """POST /download and poll /status until terminal - latency is submit to done"""
+    phase = Phase('jobs')
+    finished = []
+    run_tag = f'{int(time.time())}{random.randrange(1000)}'
+
+    def one(n):
+        url = media.page_url(f'b{run_tag}-{n}', args.size, args.kind, args.frags)
+        started = time.perf_counter()
+        while True:
+            status, headers, _, body = fetch(f'{base}/download', data={'url': url, 'mode': args.mode})
+            if status != 429:
+                break
+            time.sleep(float(headers.get('Retry-After', 1)))
+        job_id = (body or {}).get('download_id')
+        record = {}
+        while job_id:
+            t = time.perf_counter()
+            record = fetch(f'{base}/status/{job_id}')[3] or {}
+            status_phase.record(time.perf_counter() - t)
+            if record.get('status') in ('complete', 'error', 'expired'):
+                break
+            time.sleep(args.poll)
+        ok = record.get('status') == 'complete'
+        fetched = args.size if args.mode == 'video' else max(args.size // 10, 1024)
+        phase.record(time.perf_counter() - started, fetched if ok else 0, ok)
+        if ok:
+            finished.append((job_id, record.get('filename')))
+
+    with phase, ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(one, range(args.jobs)))
+    return phase, finished
+
+
+def run_status(base, finished, args):
+    phase = Phase('status')
+    ids = [job_id for job_id, _ in finished] or ['missing']
+
+    def one(n):
+        t = time.perf_counter()
+        status, _, length, _ = fetch(f'{base}/status/{ids[n % len(ids)]}')
+        phase.record(time.perf_counter() - t, length, status == 200)
+
+    with phase, ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(one, range(args.status_requests)))
+    return phase
+
+
+def run_serve(base, finished, args):
+    """GET /download/<file> to the last byte - optional Range to mimic seeking players"""
+    phase = Phase('serve')
+    files = [name for _, name in finished if name]
+    if not files:
+        return None
+    headers = {'Range': f'bytes=0-{args.range_bytes - 1}'} if args.range_bytes else {}
+
+    def one(n):
+        t = time.perf_counter()
+        status, _, received, _ = fetch(f'{base}/download/{quote(files[n % len(files)])}', headers=headers)
+        phase.record(time.perf_counter() - t, received, status in (200, 206))
+
+    with phase, ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(one, range(args.serve_requests)))
+    return phase
+
+
+# --- reporting --------------------------------------------------------------
+# Higher is better for these keys, lower for the rest that are compared
+HIGHER_IS_BETTER = ('throughput_per_s', 'mb_per_s')
+COMPARED = HIGHER_IS_BETTER + ('p50_ms', 'p99_ms')
+
+
+def compare(results, baseline, tolerance):
+    """Return regression messages - ``tolerance`` is the allowed fraction (0.2 = 20%)"""
+    problems = []
+    for name, current in results.items():
+        old = baseline.get(name) or {}
+        for key in COMPARED:
+            before, now = old.get(key), current.get(key)
+            if not before or now is None:
+                continue
+            worse = now < before * (1 - tolerance) if key in HIGHER_IS_BETTER else now > before * (1 + tolerance)
+            if worse:
+                problems.append(f'{name}.{key}: {before} -> {now}')
+    return problems
+
+
+def print_report(results):
+    cols = ('requests', 'errors', 'throughput_per_s', 'mb_per_s', 'p50_ms', 'p99_ms', 'cpu_pct', 'rss_mb')
+    print(f"{'phase':<8}" + ''.join(f'{c:>18}' for c in cols))
+    for name, result in results.items():
+        print(f'{name:<8}' + ''.join(f"{'-' if result[c] is None else result[c]:>18}" for c in cols))
+
+
+def parse_size(text):
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*([KMG]?)B?$', text.strip(), re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f'bad size: {text}')
+    return int(float(match.group(1)) * 1024 ** ' KMG'.index(match.group(2).upper() or ' '))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark for the download app')
+    parser.add_argument('--jobs', type=int, default=40, help='download jobs to run')
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('--size', type=parse_size, default=parse_size('5MB'), help='media size, e.g. 512KB, 20MB')
+    parser.add_argument('--kind', choices=('progressive', 'fragmented'), default='progressive')
+    parser.add_argument('--mode', default='video', help='output mode: video, mp3, m4a, opus (mp3/opus need ffmpeg)')
+    parser.add_argument('--frags', type=int, default=10, help='fragments per fragmented media')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake extraction latency (s)')
+    parser.add_argument('--frag-latency', type=float, default=0.0, help='fake per-fragment latency (s)')
+    parser.add_argument('--workers', type=int, default=None, help='DOWNLOAD_WORKERS for the app')
+    parser.add_argument('--poll', type=float, default=0.2, help='/status poll interval while a job runs')
+    parser.add_argument('--status-requests', type=int, default=2000)
+    parser.add_argument('--serve-requests', type=int, default=200)
+    parser.add_argument('--range-bytes', type=parse_size, default=0, help='serve phase: request only the first N bytes')
+    parser.add_argument('--workdir', help='app scratch dir (default: fresh temp dir)')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('-v', '--verbose', action='store_true', help='keep app and yt-dlp output')
+    args = parser.parse_args()
+
+    args.json = args.json and os.path.abspath(args.json)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+    # 🧪 The app uses relative paths - run it in a scratch dir, in-process threads only
+    os.chdir(args.workdir or tempfile.mkdtemp(prefix='bench-'))
+    os.environ.pop('WORKER_QUEUE_PATH', None)
+    if args.workers:
+        os.environ['DOWNLOAD_WORKERS'] = str(args.workers)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    register_stub_extractor()
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        import app
+    import logging
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    from werkzeug.serving import make_server
+
+    media = FakeMediaServer(latency=args.latency, frag_latency=args.frag_latency).start()
+    web = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=web.serve_forever, name='bench-web', daemon=True).start()
+    base = f'http://127.0.0.1:{web.server_port}'
+    print(f"🏁 {args.jobs} {args.kind} jobs of {app.format_bytes(args.size)} at concurrency {args.concurrency} "
+          f"(workdir {os.getcwd()})")
+
+    results = {}
+    with quiet:
+        status_during_jobs = Phase('status_during_jobs')
+        with status_during_jobs:
+            jobs, finished = run_jobs(base, media, args, status_during_jobs)
+        results['jobs'] = jobs.result()
+        results['poll'] = status_during_jobs.result()
+        results['status'] = run_status(base, finished, args).result()
+        serve = run_serve(base, finished, args)
+        if serve:
+            results['serve'] = serve.result()
+    web.shutdown()
+    media.shutdown()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f"💾 Results: {args.json}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            problems = compare(results, json.load(f).get('results', {}), args.tolerance)
+        for problem in problems:
+            print(f"❌ Regression {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ Within tolerance of baseline")
+
+
+if __name__ == '__main__':
+    main()
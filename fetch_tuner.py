@@ -0,0 +1,138 @@
+import math
+import threading
+import time
+
+FRAGMENT_PROTOCOLS = ('http_dash_segments', 'http_dash_segments_generator', 'm3u8_native', 'ism', 'f4m')
+
+
+def is_fragmented(fmt):
+    """True when the pick is fetched in fragments - the only case where parallel fragments help"""
+    parts = fmt.get('requested_formats') or [fmt]
+    return any(f.get('fragments') or f.get('protocol') in FRAGMENT_PROTOCOLS for f in parts)
+
+
+class FetchLease:
+    """🎟️ One fetch's share of the connection budget
+
+    Feed it progress hook dicts, and close it when the download ends.
+    ``params`` are the yt-dlp params for this fetch. Its retry sleep
+    functions count every retry and back off exponentially.
+    """
+
+    def __init__(self, tuner, platform, fragments, retries, timeout, fragmented):
+        self.tuner = tuner
+        self.platform = platform
+        self.fragments = fragments
+        self.retries = retries
+        self.timeout = timeout
+        self.fragmented = fragmented
+        self.retry_count = 0
+        self.file_bytes = {}
+        self.started = time.perf_counter()
+        self.closed = False
+
+    @property
+    def params(self):
+        return {
+            'concurrent_fragment_downloads': self.fragments,
+            'retries': self.retries,
+            'fragment_retries': self.retries,
+            'socket_timeout': self.timeout,
+            'retry_sleep_functions': {'http': self._retry_sleep, 'fragment': self._retry_sleep},
+        }
+
+    def _retry_sleep(self, n):
+        self.retry_count += 1
+        return min(2 ** n, 30)
+
+    def observe(self, d):
+        if d.get('status') in ('downloading', 'finished') and d.get('downloaded_bytes'):
+            self.file_bytes[d.get('filename')] = d['downloaded_bytes']
+
+    def close(self, ok):
+        if not self.closed:
+            self.closed = True
+            self.tuner._finish(self, ok, sum(self.file_bytes.values()), time.perf_counter() - self.started)
+
+
+class FetchTuner:
+    """🎛️ Fragment concurrency, retries and socket timeout per platform, learned from finished fetches
+
+    Fragment connections come out of one global ``budget`` shared by every
+    running fetch. A job gets at most an equal share of it, never more than
+    what is free, and never more than its platform's limit. Every fetch is
+    allowed one connection.
+
+    The platform limit moves like TCP's window. It grows by one after a clean
+    fetch that used the whole limit. It halves after a fetch that needed
+    retries or failed. It drops by one when per-connection speed falls below
+    half its average, which happens when the uplink is saturated.
+
+    Retries follow the platform's recent retry rate. The socket timeout
+    follows its per-connection speed.
+    """
+
+    def __init__(self, budget=16, initial=4, max_fragments=16, retries=5, timeout=20,
+                 min_timeout=10, max_timeout=60, alpha=0.3):
+        self.budget = budget
+        self.initial = initial
+        self.max_fragments = max_fragments
+        self.retries = retries
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.active = 0
+        self.platforms = {}
+
+    def _stats(self, platform):
+        return self.platforms.setdefault(platform, {
+            'limit': min(self.initial, self.max_fragments), 'speed': None, 'retry_rate': 0.0, 'fetches': 0, 'failures': 0,
+        })
+
+    def _timeout(self, stats):
+        """Room for a 4 MiB read at the platform's per-connection speed, more while it keeps retrying"""
+        timeout = 4 * 1024 * 1024 / stats['speed'] if stats['speed'] else self.timeout
+        timeout *= 1 + min(stats['retry_rate'], 2) / 2
+        return round(min(max(timeout, self.min_timeout), self.max_timeout), 1)
+
+    def lease(self, platform, fragmented=True):
+        with self.lock:
+            stats = self._stats(platform)
+            fragments = 1
+            if fragmented:
+                share = self.budget // (self.active + 1)
+                fragments = max(1, min(stats['limit'], share, self.budget - self.in_use))
+            self.in_use += fragments
+            self.active += 1
+            retries = min(self.retries * 3, self.retries + math.ceil(stats['retry_rate']))
+            return FetchLease(self, platform, fragments, retries, self._timeout(stats), fragmented)
+
+    def _finish(self, lease, ok, nbytes, seconds):
+        with self.lock:
+            self.in_use -= lease.fragments
+            self.active -= 1
+            stats = self._stats(lease.platform)
+            stats['fetches'] += 1
+            stats['failures'] += not ok
+            retries = lease.retry_count + (0 if ok else lease.retries)
+            stats['retry_rate'] += self.alpha * (retries - stats['retry_rate'])
+            per_connection = nbytes / seconds / lease.fragments if ok and nbytes and seconds > 0 else None
+            old_speed = stats['speed']
+            if per_connection:
+                stats['speed'] = per_connection if old_speed is None else old_speed + self.alpha * (per_connection - old_speed)
+            if not lease.fragmented:
+                return
+            if retries:
+                stats['limit'] = max(1, stats['limit'] // 2)
+            elif per_connection and old_speed and per_connection < old_speed / 2:
+                stats['limit'] = max(1, stats['limit'] - 1)
+            elif ok and lease.fragments >= stats['limit']:
+                stats['limit'] = min(self.max_fragments, stats['limit'] + 1)
+
+    def snapshot(self):
+        with self.lock:
+            return {'in_use': self.in_use, 'active': self.active,
+                    'platforms': {p: dict(s) for p, s in self.platforms.items()}}
@@ -0,0 +1,174 @@
+import math
+import re
+import threading
+
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?\s*$', re.I)
+
+
+def parse_size(value):
+    """'50M', '1.5GB', '800k' or plain bytes -> int bytes, ValueError otherwise"""
+    match = SIZE_RE.match(str(value))
+    if not match:
+        raise ValueError(f'Bad size: {value!r}')
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def make_budget(max_size=None, max_time=None, max_bitrate=None):
+    """📏 Job budget dict - only the limits the caller gave, so no limits == {}
+
+    ``max_size`` is bytes (or a '50M' string), ``max_time`` seconds of
+    transfer at the measured link speed, ``max_bitrate`` kbit/s.
+    """
+    budget = {}
+    if max_size not in (None, ''):
+        budget['max_bytes'] = parse_size(max_size)
+    if max_time not in (None, ''):
+        budget['max_time'] = float(max_time)
+    if max_bitrate not in (None, ''):
+        budget['max_kbps'] = float(max_bitrate)
+    if not all(math.isfinite(v) and v > 0 for v in budget.values()):
+        raise ValueError('Limits must be positive numbers')
+    return budget
+
+
+class LinkSpeed:
+    """📶 Per-platform moving average of observed download speed (bytes/s)"""
+
+    def __init__(self, default, alpha=0.3):
+        self.default = default
+        self.alpha = alpha
+        self.speeds = {}
+        self.lock = threading.Lock()
+
+    def observe(self, platform, nbytes, seconds):
+        if nbytes <= 0 or seconds <= 0:
+            return
+        speed = nbytes / seconds
+        with self.lock:
+            old = self.speeds.get(platform)
+            self.speeds[platform] = speed if old is None else old + self.alpha * (speed - old)
+
+    def get(self, platform):
+        with self.lock:
+            return self.speeds.get(platform, self.default)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.speeds)
+
+
+def estimate_size(fmt, duration=None):
+    """Bytes for one format - exact size, yt-dlp's approximation, or bitrate x duration"""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+    kbps = fmt.get('tbr') or ((fmt.get('vbr') or 0) + (fmt.get('abr') or 0))
+    if kbps and duration:
+        return int(kbps * 125 * duration)  # kbit/s -> bytes/s
+    return None
+
+
+def estimate_bitrate(fmt, duration=None):
+    """kbit/s for one format - declared, or derived from its size"""
+    kbps = fmt.get('tbr') or ((fmt.get('vbr') or 0) + (fmt.get('abr') or 0))
+    if kbps:
+        return kbps
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    return size / duration / 125 if size and duration else None
+
+
+def _parts(chosen):
+    return chosen.get('requested_formats') or [chosen]
+
+
+def _streams(chosen):
+    """(has video, has audio) - a budget pick must not lose a stream the default pick has"""
+    parts = _parts(chosen)
+    return (any(f.get('vcodec') != 'none' for f in parts), any(f.get('acodec') != 'none' for f in parts))
+
+
+def _total(values):
+    return None if None in values else sum(values)
+
+
+def selection_estimate(chosen, duration=None):
+    """(bytes, kbit/s) for a pick, merged picks summed - None when any part is unknown"""
+    parts = _parts(chosen)
+    return (_total([estimate_size(f, duration) for f in parts]),
+            _total([estimate_bitrate(f, duration) for f in parts]))
+
+
+def byte_limit(budget, link_speed=None):
+    """Effective size cap - the tighter of max_bytes and max_time at ``link_speed``"""
+    limits = []
+    if budget.get('max_bytes'):
+        limits.append(budget['max_bytes'])
+    if budget.get('max_time') and link_speed:
+        limits.append(int(budget['max_time'] * link_speed))
+    return min(limits) if limits else None
+
+
+def _within(size, kbps, max_bytes, max_kbps):
+    if max_bytes and (size is None or size > max_bytes):
+        return False
+    if max_kbps and (kbps is None or kbps > max_kbps):
+        return False
+    return True
+
+
+def fit_format(ydl, info, budget=None, link_speed=None):
+    """🎯 Best pick of ``ydl``'s own selector that fits the budget
+
+    While the selector's pick is over the limits, the heaviest part of the
+    pick (unknown size counts as heaviest) is removed and the selector runs
+    again - until the pick would lose its video or audio. Platform
+    preferences (mp4, merges, height caps) stay in charge - the budget only
+    takes renditions away.
+
+    Returns ``(chosen, estimated_bytes, fits)`` - fits is None without a
+    budget or when no size can be estimated, False when nothing fits
+    (chosen is then the smallest known, for the caller's error message).
+    """
+    duration = info.get('duration')
+    formats = info.get('formats')
+    if not formats:
+        return (info, selection_estimate(info, duration)[0], None)
+    budget = budget or {}
+    max_bytes = byte_limit(budget, link_speed)
+    max_kbps = budget.get('max_kbps')
+    picked = ydl._select_formats(formats, ydl.format_selector)
+    if not picked:
+        return (info, selection_estimate(info, duration)[0], None)
+    default = picked[0]
+    if not (max_bytes or max_kbps):
+        return (default, selection_estimate(default, duration)[0], None)
+
+    candidates = list(formats)
+    streams = _streams(default)
+    smallest = None
+    while candidates:
+        picked = ydl._select_formats(candidates, ydl.format_selector)
+        if not picked:
+            break
+        chosen = picked[0]
+        if _streams(chosen) != streams:
+            break  # only an audio-only (or silent) rendition is left
+        size, kbps = selection_estimate(chosen, duration)
+        if _within(size, kbps, max_bytes, max_kbps):
+            return (chosen, size, True)
+        if size is not None and (smallest is None or size < smallest[1]):
+            smallest = (chosen, size)
+        heaviest = max(_parts(chosen), key=lambda f: estimate_size(f, duration) or float('inf'))
+        candidates = [f for f in candidates if f.get('format_id') != heaviest.get('format_id')]
+    if smallest:
+        return (smallest[0], smallest[1], False)
+    return (default, selection_estimate(default, duration)[0], None)
+
+
+def pin_format(ydl, chosen, fallback):
+    """Make ``ydl`` download exactly ``chosen`` - ``fallback`` if its id is gone after a re-resolve"""
+    format_spec = f"{chosen['format_id']}/{fallback}" if chosen.get('format_id') else fallback
+    ydl.params['format'] = format_spec
+    ydl.format_selector = ydl.build_format_selector(format_spec)
+    return format_spec
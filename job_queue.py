@@ -0,0 +1,163 @@
+import json
+import math
+import sqlite3
+import threading
+import time
+
+from scheduler import PRIORITIES, QueueFull
+
+
+class SQLiteJobQueue:
+    """📬 Durable job queue in a SQLite file for out-of-process workers
+
+    The web tier ``put``s jobs, ``worker.py`` processes ``claim`` them. Any
+    process that can open the file can take part, and no outside service is
+    needed. Claims respect the same per-platform concurrency caps as the
+    in-process scheduler, counted across all workers. Workers renew their
+    claims with ``heartbeat`` - a claim not renewed for ``claim_timeout``
+    seconds (its worker died or hung) is handed out again.
+    """
+
+    def __init__(self, path, max_queue=64, platform_limits=None, default_limit=4,
+                 workers=4, claim_timeout=300):
+        self.path = path
+        self.max_queue = max_queue
+        self.platform_limits = platform_limits or {}
+        self.default_limit = default_limit
+        self.workers = workers
+        self.claim_timeout = claim_timeout
+        self.local = threading.local()
+        db = self._db()
+        db.execute('CREATE TABLE IF NOT EXISTS queue (id TEXT PRIMARY KEY, payload TEXT NOT NULL, '
+                   'platform TEXT, priority INTEGER, seq INTEGER, dedupe_key TEXT, '
+                   'state TEXT NOT NULL, claimed_by TEXT, claimed_at REAL, enqueued REAL)')
+        db.execute("CREATE UNIQUE INDEX IF NOT EXISTS queue_dedupe ON queue (dedupe_key)")
+        db.execute('CREATE INDEX IF NOT EXISTS queue_order ON queue (state, priority, seq)')
+        db.execute('CREATE TABLE IF NOT EXISTS queue_stats (name TEXT PRIMARY KEY, value REAL)')
+
+    def _db(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            self.local.db = db
+        return db
+
+    def put(self, job_id, payload, platform, priority='normal', dedupe_key=None):
+        """Queue a job; returns the id of the job that will do the work
+
+        If an active job already has ``dedupe_key`` its id is returned
+        instead. Raises ``QueueFull`` when the queue is saturated.
+        """
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if dedupe_key:
+                row = db.execute('SELECT id FROM queue WHERE dedupe_key = ?', (dedupe_key,)).fetchone()
+                if row:
+                    db.execute('COMMIT')
+                    return row[0]
+            queued = db.execute("SELECT COUNT(*) FROM queue WHERE state = 'queued'").fetchone()[0]
+            if queued >= self.max_queue:
+                db.execute('COMMIT')
+                raise QueueFull(self._retry_after(queued))
+            now = time.time()
+            db.execute('INSERT INTO queue (id, payload, platform, priority, seq, dedupe_key, state, enqueued) '
+                       "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+                       (job_id, json.dumps(payload), platform, PRIORITIES.get(priority, 1),
+                        time.monotonic_ns(), dedupe_key, now))
+            db.execute('COMMIT')
+            return job_id
+        except sqlite3.Error:
+            db.execute('ROLLBACK')
+            raise
+
+    def claim(self, worker_id):
+        """Take the next runnable job as ``(job_id, payload)`` or None"""
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            db.execute("UPDATE queue SET state = 'queued', claimed_by = NULL "
+                       "WHERE state = 'claimed' AND claimed_at < ?", (now - self.claim_timeout,))
+            running = dict(db.execute("SELECT platform, COUNT(*) FROM queue WHERE state = 'claimed' "
+                                      "GROUP BY platform").fetchall())
+            for job_id, payload, platform in db.execute(
+                    "SELECT id, payload, platform FROM queue WHERE state = 'queued' "
+                    "ORDER BY priority, seq").fetchall():
+                if running.get(platform, 0) >= self.platform_limits.get(platform, self.default_limit):
+                    continue
+                db.execute("UPDATE queue SET state = 'claimed', claimed_by = ?, claimed_at = ? WHERE id = ?",
+                           (worker_id, now, job_id))
+                db.execute('COMMIT')
+                return job_id, json.loads(payload)
+            db.execute('COMMIT')
+            return None
+        except sqlite3.Error:
+            db.execute('ROLLBACK')
+            raise
+
+    def heartbeat(self, worker_id, job_ids):
+        """💓 Renew ``worker_id``'s claims on ``job_ids`` - returns the ids it still holds"""
+        if not job_ids:
+            return []
+        db = self._db()
+        marks = ','.join('?' * len(job_ids))
+        db.execute(f"UPDATE queue SET claimed_at = ? WHERE state = 'claimed' AND claimed_by = ? AND id IN ({marks})",
+                   (time.time(), worker_id, *job_ids))
+        return [row[0] for row in db.execute(
+            f"SELECT id FROM queue WHERE state = 'claimed' AND claimed_by = ? AND id IN ({marks})",
+            (worker_id, *job_ids)).fetchall()]
+
+    def release_dead_claims(self, is_alive):
+        """♻️ Requeue claims whose worker is gone - ``is_alive(worker_id)`` decides
+
+        Lets a restarted worker pool pick interrupted jobs up at once
+        instead of waiting out ``claim_timeout``. Returns the job ids.
+        """
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            dead = [job_id for job_id, worker_id in
+                    db.execute("SELECT id, claimed_by FROM queue WHERE state = 'claimed'").fetchall()
+                    if not is_alive(worker_id)]
+            db.executemany("UPDATE queue SET state = 'queued', claimed_by = NULL WHERE id = ?",
+                           [(job_id,) for job_id in dead])
+            db.execute('COMMIT')
+            return dead
+        except sqlite3.Error:
+            db.execute('ROLLBACK')
+            raise
+
+    def complete(self, job_id, duration=None):
+        db = self._db()
+        db.execute('DELETE FROM queue WHERE id = ?', (job_id,))
+        if duration is not None:
+            avg = self._avg_duration()
+            db.execute('INSERT OR REPLACE INTO queue_stats (name, value) VALUES (?, ?)',
+                       ('avg_duration', 0.8 * avg + 0.2 * duration))
+
+    def _avg_duration(self):
+        row = self._db().execute("SELECT value FROM queue_stats WHERE name = 'avg_duration'").fetchone()
+        return row[0] if row else 30.0
+
+    def _retry_after(self, queued):
+        return max(1, math.ceil(self._avg_duration() * queued / self.workers))
+
+    def queue_positions(self):
+        """[(job_id, position, estimated_wait_seconds)] in claim order"""
+        avg = round(self._avg_duration())
+        rows = self._db().execute("SELECT id FROM queue WHERE state = 'queued' ORDER BY priority, seq").fetchall()
+        return [(row[0], position, math.ceil(position / self.workers) * avg)
+                for position, row in enumerate(rows, 1)]
+
+    def stats(self):
+        counts = dict(self._db().execute('SELECT state, COUNT(*) FROM queue GROUP BY state').fetchall())
+        by_platform = dict(self._db().execute("SELECT platform, COUNT(*) FROM queue WHERE state = 'claimed' "
+                                              "GROUP BY platform").fetchall())
+        return {
+            'queued': counts.get('queued', 0),
+            'running': counts.get('claimed', 0),
+            'workers': self.workers,
+            'by_platform': by_platform,
+        }
@@ -0,0 +1,251 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from progress import StatusRecord, TERMINAL_STATES
+
+# 🧹 Only useful while a job runs - dropped once it finishes
+TRANSIENT_KEYS = ('url', 'speed_bps', 'downloaded_bytes', 'total_bytes', 'eta_seconds', 'queue_position',
+                  'queue_eta', 'attached_to', 'stream_url', 'resume', 'stage', 'stage_span', 'stage_started',
+                  'stage_expected')
+
+
+class JobStore:
+    """🗃️ Bounded in-memory job records with TTL and size eviction
+
+    Behaves like the old ``download_status`` dict for the routes and jobs.
+    Finished jobs are compacted to their result fields and evicted after
+    ``ttl`` seconds, or oldest-first once more than ``max_jobs`` are held.
+    Running jobs are never evicted. Followers of a coalesced job are stored
+    as aliases of the leader's record.
+    """
+
+    def __init__(self, max_jobs=10000, ttl=6 * 3600, stale_after=3600):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.lock = threading.RLock()
+        self.records = OrderedDict()
+        self.aliases = {}
+        self.last_evict = 0
+
+    # --- dict-style access used by app.py -------------------------------
+    def __setitem__(self, job_id, record):
+        if not isinstance(record, StatusRecord):
+            record = StatusRecord(record)
+        with self.lock:
+            if record.job_id and record.job_id != job_id:
+                # 🛫 Same record under another id - follower of a coalesced job
+                self.alias(job_id, record.job_id)
+                return
+            record.store, record.job_id = self, job_id
+            self.records[job_id] = record
+            self.aliases.pop(job_id, None)
+            self.save(job_id, record, force=True)
+            self._evict()
+
+    def __getitem__(self, job_id):
+        record = self.get(job_id)
+        if record is None:
+            raise KeyError(job_id)
+        return record
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def __len__(self):
+        with self.lock:
+            return len(self.records)
+
+    def get(self, job_id, default=None):
+        with self.lock:
+            job_id = self.aliases.get(job_id, job_id)
+            record = self.records.get(job_id)
+            if record is not None:
+                return record
+            record = self._load(job_id)
+            if record is None:
+                return default
+            # 💀 Written by a process that stopped updating it
+            if self._is_stale(record):
+                dict.update(record, {'status': 'error', 'progress': 0,
+                                     'error': 'Job interrupted - please retry'})
+            return record
+
+    def pop(self, job_id, default=None):
+        with self.lock:
+            self.aliases.pop(job_id, None)
+            record = self.records.pop(job_id, default)
+            self._delete(job_id)
+            return record
+
+    def adopt(self, job_id):
+        return self.get(job_id)
+
+    def unfinished(self):
+        """[(job_id, record)] for jobs not in a terminal state - resume candidates after a restart"""
+        with self.lock:
+            return [(job_id, record) for job_id, record in self.records.items()
+                    if record.get('status') not in TERMINAL_STATES]
+
+    def resumable_temps(self):
+        """Temp dir names that unfinished jobs will resume from"""
+        return {record['resume']['temp'] for _, record in self.unfinished()
+                if (record.get('resume') or {}).get('temp')}
+
+    def touch(self, job_id):
+        """💓 Mark a running job's record as alive - written through even without changes"""
+        with self.lock:
+            record = self.records.get(job_id)
+            if record is not None and record.get('status') not in TERMINAL_STATES:
+                self.save(job_id, record, force=True)
+
+    def alias(self, job_id, target_id):
+        with self.lock:
+            if self.records.pop(job_id, None) is not None:
+                self._delete(job_id)
+            self.aliases[job_id] = self.aliases.get(target_id, target_id)
+            self._save_alias(job_id, self.aliases[job_id])
+
+    # --- persistence hooks ----------------------------------------------
+    def save(self, job_id, record, force=False):
+        """Called by StatusRecord on every write"""
+        now = time.time()
+        if record.get('status') in TERMINAL_STATES:
+            for key in TRANSIENT_KEYS:
+                dict.pop(record, key, None)
+            force = True
+        if not force and now - record.updated < 1.0:
+            return
+        record.updated = now
+        self._persist(job_id, record, now)
+
+    def _is_stale(self, record):
+        # Queued jobs have no owner to keep them fresh yet
+        if record.get('status') in TERMINAL_STATES or record.get('status') == 'queued':
+            return False
+        return time.time() - record.updated > self.stale_after
+
+    def _persist(self, job_id, record, now):
+        pass
+
+    def _load(self, job_id):
+        return None
+
+    def _delete(self, job_id):
+        pass
+
+    def _save_alias(self, job_id, target_id):
+        pass
+
+    # --- eviction -------------------------------------------------------
+    def _evict(self):
+        now = time.time()
+        over = len(self.records) - self.max_jobs
+        if over <= 0 and now - self.last_evict < 10:
+            return
+        self.last_evict = now
+        for job_id, record in list(self.records.items()):
+            if record.get('status') not in TERMINAL_STATES:
+                continue
+            if over > 0 or now - record.updated > self.ttl:
+                del self.records[job_id]
+                over -= 1
+            elif over <= 0:
+                break
+        if len(self.aliases) > self.max_jobs:
+            self.aliases = {a: t for a, t in self.aliases.items() if t in self.records}
+
+
+class SQLiteJobStore(JobStore):
+    """🗃️ Job records in SQLite - survive restarts, shareable across processes
+
+    Live records stay in memory for the process running them; writes go
+    through to the database (progress writes at most once a second), and
+    ids this process has not seen are read from the database on demand.
+    With ``shared=True`` (web tier in worker mode) nothing is kept in
+    memory unless ``adopt``ed, so every read sees the workers' latest writes.
+    """
+
+    def __init__(self, path, shared=False, **kwargs):
+        super().__init__(**kwargs)
+        self.shared = shared
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                        'status TEXT, updated REAL NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS job_aliases (id TEXT PRIMARY KEY, target TEXT NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated)')
+        self.db_lock = threading.Lock()
+        self.last_db_evict = 0
+
+    def __setitem__(self, job_id, record):
+        super().__setitem__(job_id, record)
+        if self.shared:
+            with self.lock:
+                self.records.pop(job_id, None)
+
+    def adopt(self, job_id):
+        """Keep a record in memory - for the worker that is running it"""
+        with self.lock:
+            record = self.get(job_id)
+            if record is not None:
+                self.records[job_id] = record
+            return record
+
+    def unfinished(self):
+        """Unfinished jobs in the database as written - no stale marking, they are about to resume"""
+        with self.db_lock:
+            rows = self.db.execute(
+                f"SELECT id, data, updated FROM jobs WHERE status NOT IN ({','.join('?' * len(TERMINAL_STATES))})",
+                TERMINAL_STATES).fetchall()
+        jobs = []
+        with self.lock:
+            for job_id, data, updated in rows:
+                record = self.records.get(job_id)
+                if record is None:
+                    record = StatusRecord(json.loads(data))
+                    record.store, record.job_id, record.updated = self, job_id, updated
+                jobs.append((job_id, record))
+        return jobs
+
+    def _persist(self, job_id, record, now):
+        with self.db_lock:
+            self.db.execute('INSERT OR REPLACE INTO jobs (id, data, status, updated) VALUES (?, ?, ?, ?)',
+                            (job_id, json.dumps(record, default=str), record.get('status'), now))
+
+    def _load(self, job_id):
+        with self.db_lock:
+            row = self.db.execute('SELECT target FROM job_aliases WHERE id = ?', (job_id,)).fetchone()
+            if row:
+                job_id = row[0]
+            row = self.db.execute('SELECT data, updated FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if not row:
+            return None
+        record = StatusRecord(json.loads(row[0]))
+        record.store, record.job_id, record.updated = self, job_id, row[1]
+        return record
+
+    def _delete(self, job_id):
+        with self.db_lock:
+            self.db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            self.db.execute('DELETE FROM job_aliases WHERE id = ? OR target = ?', (job_id, job_id))
+
+    def _save_alias(self, job_id, target_id):
+        with self.db_lock:
+            self.db.execute('INSERT OR REPLACE INTO job_aliases (id, target) VALUES (?, ?)', (job_id, target_id))
+
+    def _evict(self):
+        super()._evict()
+        now = time.time()
+        if now - self.last_db_evict < 60:
+            return
+        self.last_db_evict = now
+        cutoff = now - self.ttl
+        with self.db_lock:
+            self.db.execute(f"DELETE FROM jobs WHERE updated < ? AND status IN ({','.join('?' * len(TERMINAL_STATES))})",
+                            (cutoff, *TERMINAL_STATES))
+            self.db.execute('DELETE FROM job_aliases WHERE target NOT IN (SELECT id FROM jobs)')
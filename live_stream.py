@@ -0,0 +1,76 @@
+import os
+import threading
+
+CHUNK_SIZE = 256 * 1024
+
+
+class LiveFile:
+    """📡 A file yt-dlp is still writing, readable while it grows"""
+
+    def __init__(self, total=None):
+        self.path = None
+        self.total = total
+        self.written = 0
+        self.done = False
+        self.ok = False
+        self.cond = threading.Condition()
+
+    def grow(self, path, written, total=None):
+        with self.cond:
+            self.path = path or self.path
+            self.written = max(self.written, written or 0)
+            self.total = total or self.total
+            self.cond.notify_all()
+
+    def finish(self, ok):
+        with self.cond:
+            self.done = True
+            self.ok = ok
+            self.cond.notify_all()
+
+    def wait_for_path(self, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.path or self.done, timeout)
+            return self.path
+
+    def tail(self, chunk_size=CHUNK_SIZE, idle_timeout=60):
+        """Yield bytes as they land on disk until the download finishes
+
+        The file handle stays valid when yt-dlp renames ``.part`` to the
+        final name, so a single open covers the whole transfer.
+        """
+        path = self.wait_for_path(idle_timeout)
+        if not path:
+            return
+        while not os.path.exists(path) and not self.done:
+            with self.cond:
+                self.cond.wait(0.5)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return
+        with f:
+            while True:
+                chunk = f.read(chunk_size)
+                if chunk:
+                    yield chunk
+                    continue
+                with self.cond:
+                    if self.done:
+                        finished = True
+                    else:
+                        finished = False
+                        if not self.cond.wait(idle_timeout):
+                            return
+                if finished:
+                    rest = f.read()
+                    if rest:
+                        yield rest
+                    return
+
+
+def is_streamable(info, pp_plan):
+    """Only progressive single files with no ffmpeg step can be tee'd as they download"""
+    if info.get('requested_formats') or pp_plan['mode'] != 'none':
+        return False
+    return info.get('protocol', 'https') in ('http', 'https')
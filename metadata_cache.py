@@ -0,0 +1,143 @@
+import copy
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+
+def _url_expiry(url):
+    """Expiry timestamp baked into a signed media URL, if any"""
+    if not url:
+        return None
+    try:
+        parsed = urlparse(url)
+        params = parse_qs(parsed.query)
+        for name in ('expire', 'expires', 'Expires', 'exp'):
+            if name in params and params[name][0].isdigit():
+                return int(params[name][0])
+        # 📘 Facebook/Instagram CDN - hex unix time in 'oe'
+        if 'oe' in params:
+            return int(params['oe'][0], 16)
+        # 📺 YouTube manifests - /expire/<ts>/ path segment
+        match = re.search(r'/expire/(\d+)', parsed.path)
+        if match:
+            return int(match.group(1))
+    except (ValueError, IndexError):
+        pass
+    return None
+
+
+class MetadataEntry:
+    """Cached info dict plus the time its format URLs stop working"""
+
+    __slots__ = ('info', 'fetched_at', 'download_deadline')
+
+    def __init__(self, info, fetched_at, download_deadline):
+        self.info = info
+        self.fetched_at = fetched_at
+        self.download_deadline = download_deadline
+
+    def downloadable(self, now=None):
+        """True while the resolved format URLs can still be fetched"""
+        return (now or time.time()) < self.download_deadline
+
+
+class MetadataCache:
+    """🧠 TTL + LRU cache of yt-dlp info dicts, optionally persisted to JSON
+
+    ``ttl`` bounds how long metadata (title, id, formats) is reused at all.
+    Format URLs usually expire much sooner, so each entry also carries a
+    download deadline taken from the signed URLs themselves, falling back to
+    ``format_ttl``. Stale-for-download entries are still good for ids and
+    cache keys; only the download needs a fresh resolve.
+    """
+
+    def __init__(self, ttl=3600, max_entries=512, format_ttl=300,
+                 expiry_margin=60, persist_path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.format_ttl = format_ttl
+        self.expiry_margin = expiry_margin
+        self.persist_path = persist_path
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self._load()
+
+    def _deadline(self, info, fetched_at):
+        formats = info.get('requested_formats') or [info]
+        expiries = [e for e in (_url_expiry(f.get('url')) for f in formats) if e]
+        if expiries:
+            return min(expiries) - self.expiry_margin
+        return fetched_at + self.format_ttl
+
+    def lookup(self, url):
+        """Return a ``MetadataEntry`` copy for ``url`` or None"""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None
+            if time.time() - entry.fetched_at > self.ttl:
+                del self.entries[url]
+                return None
+            self.entries.move_to_end(url)
+            return MetadataEntry(copy.deepcopy(entry.info), entry.fetched_at, entry.download_deadline)
+
+    def put(self, url, info):
+        """Store a sanitised (JSON-safe) info dict for ``url``"""
+        now = time.time()
+        entry = MetadataEntry(copy.deepcopy(info), now, self._deadline(info, now))
+        with self.lock:
+            self.entries[url] = entry
+            self.entries.move_to_end(url)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self._save()
+        return entry
+
+    def invalidate(self, url):
+        with self.lock:
+            self.entries.pop(url, None)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def _load(self):
+        if not self.persist_path:
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for url, raw in data.items():
+            if now - raw['fetched_at'] <= self.ttl:
+                self.entries[url] = MetadataEntry(raw['info'], raw['fetched_at'], raw['download_deadline'])
+
+    def _save(self):
+        if not self.persist_path:
+            return
+        with self.lock:
+            data = {url: {'info': e.info, 'fetched_at': e.fetched_at,
+                          'download_deadline': e.download_deadline}
+                    for url, e in self.entries.items()}
+        tmp_path = f'{self.persist_path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.persist_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️ Metadata cache save failed: {e}")
+
+
+# 🧠 Shared by app.py and yt_downloader.py
+shared_cache = MetadataCache(
+    ttl=int(os.environ.get('METADATA_TTL', 3600)),
+    max_entries=int(os.environ.get('METADATA_CACHE_SIZE', 512)),
+    format_ttl=int(os.environ.get('METADATA_FORMAT_TTL', 300)),
+    persist_path=os.environ.get('METADATA_CACHE_PATH') or None,
+)
@@ -0,0 +1,202 @@
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _label_str(labelnames, labels, extra=None):
+    pairs = list(zip(labelnames, labels))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return {'type': 'counter', 'help': self.help, 'labelnames': self.labelnames,
+                    'values': [[list(k), v] for k, v in self.values.items()]}
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {'type': 'histogram', 'help': self.help, 'labelnames': self.labelnames,
+                    'buckets': self.buckets, 'values': [[list(k), list(v)] for k, v in self.values.items()]}
+
+
+class Registry:
+    """📊 Minimal Prometheus text registry - no client library needed
+
+    Counters and histograms live in-process; gauges are callbacks read at
+    scrape time. Worker processes ``dump`` snapshots to a directory and
+    the web tier merges them in ``render``.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.gauges = []
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, fn):
+        """``fn()`` returns a number or a list of ``(labels_dict, value)``"""
+        self.gauges.append((name, help_text, fn))
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def dump(self, path):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def start_dumping(self, path, interval=10):
+        def loop():
+            while True:
+                try:
+                    self.dump(path)
+                except OSError as e:
+                    print(f"⚠️ Metrics dump failed: {e}")
+                time.sleep(interval)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        threading.Thread(target=loop, name='metrics-dump', daemon=True).start()
+
+    @staticmethod
+    def load_dumps(directory, max_age=86400):
+        snapshots = []
+        now = time.time()
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                pass
+        return snapshots
+
+    def render(self, extra_snapshots=()):
+        merged = {}
+        for snap in [self.snapshot(), *extra_snapshots]:
+            for name, data in snap.items():
+                target = merged.setdefault(name, {**data, 'values': {}})
+                for labels, value in data['values']:
+                    key = tuple(labels)
+                    if data['type'] == 'counter':
+                        target['values'][key] = target['values'].get(key, 0) + value
+                    else:
+                        old = target['values'].get(key)
+                        target['values'][key] = value if old is None else [a + b for a, b in zip(old, value)]
+
+        lines = []
+        for name, data in merged.items():
+            lines.append(f"# HELP {name} {data['help']}")
+            lines.append(f"# TYPE {name} {data['type']}")
+            labelnames = data['labelnames']
+            for labels, value in data['values'].items():
+                if data['type'] == 'counter':
+                    lines.append(f"{name}{_label_str(labelnames, labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(data['buckets']) + ['+Inf'], value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_str(labelnames, labels, ('le', bound))} {cumulative}")
+                lines.append(f"{name}_sum{_label_str(labelnames, labels)} {value[-1]}")
+                lines.append(f"{name}_count{_label_str(labelnames, labels)} {cumulative}")
+
+        for name, help_text, fn in self.gauges:
+            try:
+                result = fn()
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(result, (int, float)):
+                lines.append(f"{name} {result}")
+            else:
+                for labels, value in result:
+                    lines.append(f"{name}{_label_str(tuple(labels), tuple(labels.values()))} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'download_stage_seconds', 'Time spent in each job stage', ('stage', 'platform'))
+JOBS_TOTAL = registry.counter(
+    'download_jobs_total', 'Finished jobs by outcome', ('platform', 'outcome'))
+DOWNLOAD_BYTES = registry.counter(
+    'download_bytes_total', 'Bytes fetched from platforms', ('platform',))
+TRANSFER_SECONDS = registry.counter(
+    'download_transfer_seconds_total', 'Seconds spent transferring media - bytes/seconds is throughput', ('platform',))
+SERVE_BYTES = registry.counter(
+    'serve_bytes_total', 'Bytes of finished files sent to clients', ('status',))
+SERVE_SECONDS = registry.histogram(
+    'serve_handler_seconds', 'Time to prepare a /download response', ('status',),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+
+
+class JobTimer:
+    """⏱️ Per-job stage spans - histogram per (stage, platform) plus 'timings' in the job record"""
+
+    def __init__(self, platform, record=None):
+        self.platform = platform
+        self.record = record
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        seconds = max(seconds, 0.0)
+        STAGE_SECONDS.observe(seconds, stage=name, platform=self.platform)
+        self.timings[name] = round(self.timings.get(name, 0) + seconds, 3)
+        if self.record is not None:
+            self.record['timings'] = dict(self.timings)
@@ -0,0 +1,95 @@
+from yt_dlp.postprocessor import get_postprocessor
+
+# 🎞️ Codecs an .mp4 container plays everywhere without re-encoding
+MP4_VIDEO_CODECS = ('avc1', 'avc3', 'h264', 'hev1', 'hvc1', 'hevc', 'h265', 'av01', 'mp4v')
+MP4_AUDIO_CODECS = ('mp4a', 'aac', 'mp3', 'ac-3', 'ec-3')
+MP4_CONTAINERS = ('mp4', 'm4a', 'm4v', 'mov')
+
+# 🎵 Audio-only outputs - selectors prefer a source the target can stream-copy
+AUDIO_FORMATS = {
+    'mp3': {'selector': 'bestaudio[acodec^=mp3]/bestaudio/best', 'codecs': ('mp3',), 'containers': ('mp3',)},
+    'm4a': {'selector': 'bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best',
+            'codecs': ('mp4a', 'aac'), 'containers': ('m4a',)},
+    'opus': {'selector': 'bestaudio[acodec=opus]/bestaudio/best', 'codecs': ('opus',), 'containers': ('opus',)},
+}
+OUTPUT_MODES = ('video',) + tuple(AUDIO_FORMATS)
+
+
+def _codec_ok(codec, allowed):
+    """True for an absent stream or an MP4-compatible codec, None if unknown"""
+    if codec == 'none':
+        return True
+    if not codec:
+        return None
+    return codec.lower().startswith(allowed)
+
+
+def _formats_ok(formats):
+    verdicts = []
+    for f in formats:
+        verdicts.append(_codec_ok(f.get('vcodec'), MP4_VIDEO_CODECS))
+        verdicts.append(_codec_ok(f.get('acodec'), MP4_AUDIO_CODECS))
+    if False in verdicts:
+        return False
+    return None if None in verdicts else True
+
+
+def plan_audio(fmt, codec, quality='192'):
+    """🎵 Audio-only: no ffmpeg when the download already is the target file,
+    FFmpegExtractAudio stream copy (yt-dlp copies when codecs match) or re-encode
+    """
+    spec = AUDIO_FORMATS[codec]
+    acodec = (fmt.get('acodec') or '').lower()
+    same_codec = acodec.startswith(spec['codecs'])
+    if same_codec and fmt.get('vcodec') == 'none' and fmt.get('ext') in spec['containers']:
+        return {'mode': 'none', 'postprocessors': [], 'merge_output_format': None}
+    return {
+        'mode': 'remux' if same_codec else 'transcode',
+        'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': codec, 'preferredquality': quality}],
+        'merge_output_format': None,
+    }
+
+
+def plan_postprocessing(info, target='mp4'):
+    """🎯 Pick the cheapest way to end up with an MP4 (or ``AUDIO_FORMATS`` file) for the selected formats
+
+    Returns ``{'mode', 'postprocessors', 'merge_output_format'}`` where mode is
+    'none' (already an MP4-ready file), 'remux' (stream copy into MP4) or
+    'transcode' (full FFmpegVideoConvertor pass).
+    """
+    if target in AUDIO_FORMATS:
+        return plan_audio(info, target)
+    requested = info.get('requested_formats')
+    if requested:
+        if _formats_ok(requested):
+            # 🔗 Merger stream-copies straight into mp4
+            return {'mode': 'remux', 'postprocessors': [], 'merge_output_format': target}
+        return {
+            'mode': 'transcode',
+            'postprocessors': [{'key': 'FFmpegVideoConvertor', 'preferedformat': target}],
+            'merge_output_format': None,
+        }
+
+    verdict = _formats_ok([info])
+    if info.get('ext') in MP4_CONTAINERS and verdict is not False:
+        return {'mode': 'none', 'postprocessors': [], 'merge_output_format': None}
+    if verdict:
+        return {
+            'mode': 'remux',
+            'postprocessors': [{'key': 'FFmpegVideoRemuxer', 'preferedformat': target}],
+            'merge_output_format': None,
+        }
+    return {
+        'mode': 'transcode',
+        'postprocessors': [{'key': 'FFmpegVideoConvertor', 'preferedformat': target}],
+        'merge_output_format': None,
+    }
+
+
+def apply_plan(ydl, plan):
+    """Register the planned postprocessors on a YoutubeDL instance"""
+    if plan.get('merge_output_format'):
+        ydl.params['merge_output_format'] = plan['merge_output_format']
+    for pp_def in plan['postprocessors']:
+        args = {k: v for k, v in pp_def.items() if k != 'key'}
+        ydl.add_post_processor(get_postprocessor(pp_def['key'])(ydl, **args), when='post_process')
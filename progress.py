@@ -0,0 +1,272 @@
+import json
+import threading
+import time
+
+TERMINAL_STATES = ('complete', 'error', 'expired')
+
+# 📏 Share of the whole job (percent) each stage covers - fetch gives some up when ffmpeg runs after it
+STAGE_SPANS = {
+    False: {'resolve': (0, 5), 'fetch': (5, 97), 'publish': (97, 100)},
+    True: {'resolve': (0, 5), 'fetch': (5, 80), 'postprocess_queued': (80, 80),
+           'postprocess': (80, 97), 'publish': (97, 100)},
+}
+
+
+def format_bytes(size):
+    """Format bytes to human readable"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_eta(seconds):
+    """12 -> '0:12', 3725 -> '1:02:05'"""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+class ProgressEvents:
+    """📣 Version counter that wakes stream listeners on any status change"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.version = 0
+
+    def notify(self):
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def wait(self, since, timeout):
+        """Block until the version moves past ``since`` or ``timeout`` passes"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != since, timeout)
+            return self.version
+
+
+events = ProgressEvents()
+
+
+class StatusRecord(dict):
+    """Job status dict that announces every write to ``events``
+
+    When the record belongs to a job store, writes are also handed to
+    ``store.save`` so the store can persist them. A change of 'status' is
+    always saved at once.
+    """
+
+    __slots__ = ('store', 'job_id', 'updated')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = None
+        self.job_id = None
+        self.updated = time.time()
+
+    def _changed(self, force):
+        events.notify()
+        if self.store is not None:
+            self.store.save(self.job_id, self, force=force)
+
+    def update(self, *args, **kwargs):
+        fields = dict(*args, **kwargs)
+        force = 'status' in fields and fields['status'] != self.get('status')
+        super().update(fields)
+        self._changed(force)
+
+    def __setitem__(self, key, value):
+        force = key == 'status' and value != self.get('status')
+        super().__setitem__(key, value)
+        self._changed(force)
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_progress(status_dict, download_ids, min_interval=0.25, heartbeat=15, poll_interval=None):
+    """🔴 Server-Sent Events generator for one or more jobs
+
+    The first message per job is a full snapshot (as ``present`` formats
+    it), later ones only carry the keys that changed. Bursts of hook updates are coalesced to at most
+    one message per ``min_interval``. The stream closes once every job has
+    reached a terminal state. ``poll_interval`` bounds the wait when the
+    records are written by other processes that cannot wake ``events``;
+    timed stages (ffmpeg) are re-read every second.
+    """
+    last_sent = {download_id: {} for download_id in download_ids}
+    version = -1
+    last_beat = time.time()
+    yield "retry: 2000\n\n"
+    timeout = poll_interval or heartbeat
+    while True:
+        version = events.wait(version, timeout)
+        pending = False
+        timeout = poll_interval or heartbeat
+        for download_id, last in last_sent.items():
+            snapshot = present(status_dict.get(download_id) or {'status': 'expired', 'progress': 0})
+            if snapshot.get('stage_expected') and snapshot.get('status') not in TERMINAL_STATES:
+                timeout = min(timeout, 1.0)  # ffmpeg writes nothing - its progress moves with the clock
+            delta = {k: v for k, v in snapshot.items() if last.get(k) != v}
+            if delta:
+                delta['id'] = download_id
+                yield sse('progress', delta)
+                last.update(snapshot)
+                last_beat = time.time()
+            if snapshot.get('status') not in TERMINAL_STATES:
+                pending = True
+        if not pending:
+            yield sse('done', {'ids': list(last_sent)})
+            return
+        if time.time() - last_beat >= heartbeat:
+            yield ": ping\n\n"
+            last_beat = time.time()
+        time.sleep(min_interval)
+
+
+class StageRates:
+    """⏱️ Learned seconds per MB of input for a kind of work (remux, transcode, ...)"""
+
+    def __init__(self, seeds=None, default=0.1, alpha=0.3):
+        self.default = default
+        self.alpha = alpha
+        self.rates = dict(seeds or {})
+        self.lock = threading.Lock()
+
+    def expect(self, kind, nbytes):
+        """Expected seconds for ``nbytes`` - None without a size"""
+        if not nbytes:
+            return None
+        with self.lock:
+            return self.rates.get(kind, self.default) * nbytes / 1024 ** 2
+
+    def observe(self, kind, nbytes, seconds):
+        if not nbytes or seconds <= 0:
+            return
+        rate = seconds / (nbytes / 1024 ** 2)
+        with self.lock:
+            old = self.rates.get(kind)
+            self.rates[kind] = rate if old is None else old + self.alpha * (rate - old)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.rates)
+
+
+class ProgressTracker:
+    """📈 Numeric job progress written to ``record`` at most every ``interval`` s
+
+    yt-dlp calls the hook for every chunk, from several threads with
+    concurrent fragments, so it only updates byte counters. Speed is an EWMA
+    over the writes and no strings are built here - ``present`` formats
+    them when a client reads the record. ``progress`` covers the whole job:
+    each stage maps onto its span in STAGE_SPANS, so 100 means published.
+    ``extra(d)`` adds fields from the latest hook dict to every write.
+    """
+
+    def __init__(self, record, interval=0.5, alpha=0.3, extra=None):
+        self.record = record
+        self.interval = interval
+        self.alpha = alpha
+        self.extra = extra
+        self.lock = threading.Lock()
+        self.spans = STAGE_SPANS[False]
+        self.files = {}
+        self.expected_bytes = None
+        self.postprocess_seconds = None
+        self.percent = record.get('progress') or 0
+        self.speed = None
+        self.last_write = 0.0
+        self.sampled_bytes = None
+        self.sampled_at = None
+        self.last_hook = None
+
+    def plan(self, expected_bytes=None, postprocess_seconds=None, postprocess=False):
+        """Estimated fetch size and ffmpeg time - sizes the fetch span and the ETA"""
+        with self.lock:
+            self.expected_bytes = expected_bytes
+            self.postprocess_seconds = postprocess_seconds
+            self.spans = STAGE_SPANS[bool(postprocess)]
+
+    @property
+    def fetched_bytes(self):
+        with self.lock:
+            return sum(done for done, _ in self.files.values())
+
+    def stage(self, name, expected_seconds=None, **fields):
+        """Enter stage ``name`` - written at once, with ``fields``
+
+        With ``expected_seconds`` the stage has no hook of its own (ffmpeg),
+        and ``present`` moves its progress along by elapsed time.
+        """
+        with self.lock:
+            start, end = self.spans.get(name, (self.percent, self.percent))
+            self.percent = max(self.percent, start)
+            if name != 'fetch':
+                fields = {'speed_bps': None, 'eta_seconds': expected_seconds, **fields}
+            self.record.update({'stage': name, 'progress': self.percent, 'stage_span': [start, end],
+                                'stage_started': time.time(), 'stage_expected': expected_seconds, **fields})
+
+    def hook(self, d):
+        """yt-dlp progress hook"""
+        status = d.get('status')
+        if status not in ('downloading', 'finished'):
+            return
+        now = time.monotonic()
+        with self.lock:
+            self.files[d.get('filename')] = (d.get('downloaded_bytes') or 0,
+                                             d.get('total_bytes') or d.get('total_bytes_estimate'))
+            self.last_hook = d
+            if status == 'finished' or now - self.last_write >= self.interval:
+                self.last_write = now
+                self._write(now)
+
+    def _write(self, now):
+        done = sum(done for done, _ in self.files.values())
+        total = sum(size or done for done, size in self.files.values())
+        if self.expected_bytes:
+            total = max(total, self.expected_bytes)  # the audio of a merge has not started yet
+        if self.sampled_at is None:
+            self.sampled_bytes, self.sampled_at = done, now  # resumed jobs start at an offset
+        elif now > self.sampled_at:
+            rate = (done - self.sampled_bytes) / (now - self.sampled_at)
+            self.speed = rate if self.speed is None else self.speed + self.alpha * (rate - self.speed)
+            self.sampled_bytes, self.sampled_at = done, now
+        start, end = self.spans['fetch']
+        if total:
+            self.percent = max(self.percent, int(start + (end - start) * min(done / total, 1)))
+        eta = None
+        if total and self.speed:
+            eta = max(total - done, 0) / self.speed + (self.postprocess_seconds or 0)
+        fields = {'progress': self.percent, 'downloaded_bytes': done, 'total_bytes': total or None,
+                  'speed_bps': round(self.speed) if self.speed is not None else None,
+                  'eta_seconds': round(eta) if eta is not None else None}
+        if self.extra and self.last_hook is not None:
+            fields.update(self.extra(self.last_hook))
+        self.record.update(fields)
+
+
+def present(record):
+    """🖨️ Client view of a job record - byte counts, speed and ETA formatted on read
+
+    A stage with an expected duration (ffmpeg) advances its progress by
+    elapsed time here, up to 95% of its span until the next stage starts.
+    """
+    view = dict(record)
+    span, expected, started = view.get('stage_span'), view.get('stage_expected'), view.get('stage_started')
+    if span and expected and started and view.get('status') not in TERMINAL_STATES:
+        elapsed = max(time.time() - started, 0)
+        view['progress'] = max(view.get('progress') or 0,
+                               int(span[0] + (span[1] - span[0]) * min(elapsed / expected, 0.95)))
+        view['eta_seconds'] = round(max(expected - elapsed, 0))
+    if 'downloaded_bytes' in view:
+        # The three show up together - a queued job has bytes but no speed yet
+        view['downloaded'] = format_bytes(view['downloaded_bytes'] or 0)
+        view['total'] = format_bytes(view['total_bytes']) if view.get('total_bytes') else '?'
+        view['speed'] = f"{format_bytes(view['speed_bps'])}/s" if view.get('speed_bps') is not None else ''
+    if view.get('eta_seconds') is not None:
+        view['eta'] = format_eta(view['eta_seconds'])
+    return view
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows - single process only
+    fcntl = None
+
+
+class ResultCache:
+    """💾 Content-addressed cache of finished downloads in static/downloads
+
+    Entries are keyed by (platform, video id, format selector, postprocessors)
+    and point at a finished file. A small alias table maps the submitted URL
+    to an entry so repeat URLs can skip extraction entirely. The index is a
+    JSON file next to the downloads. With ``max_bytes`` set the cache evicts
+    its own least recently used files; with None, disk space is left to
+    the storage manager, which calls ``forget_file`` on eviction.
+
+    Every read-modify-write of the index holds an ``flock`` on
+    ``<index>.lock``, so worker processes never overwrite each other's
+    updates. Hits only touch memory - access times and hit counts are
+    written with the next change, or every ``flush_interval`` seconds.
+    """
+
+    def __init__(self, root='static/downloads', max_bytes=5 * 1024 ** 3,
+                 index_name='.cache_index.json', flush_interval=60):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.index_path = os.path.join(root, index_name)
+        self.lock_path = f'{self.index_path}.lock'
+        self.lock = threading.RLock()
+        self.lock_depth = 0
+        self.entries = {}
+        self.aliases = {}
+        self.index_mtime = None
+        self.touched = {}
+        self.last_save = time.time()
+        self._load()
+
+    @staticmethod
+    def make_key(*parts):
+        """Stable key for any JSON-serialisable parts"""
+        raw = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+    @contextmanager
+    def _locked(self):
+        """Thread lock, plus the index file lock on the outermost entry"""
+        with self.lock:
+            self.lock_depth += 1
+            try:
+                if self.lock_depth > 1 or fcntl is None:
+                    yield
+                    return
+                with open(self.lock_path, 'a') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            finally:
+                self.lock_depth -= 1
+
+    def _index_mtime(self):
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh(self):
+        """Pick up entries written by other processes (worker mode)"""
+        if self._index_mtime() != self.index_mtime:
+            self._load()
+
+    def _load(self):
+        self.index_mtime = self._index_mtime()
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = data.get('entries', {})
+            self.aliases = data.get('aliases', {})
+        except (OSError, ValueError):
+            self.entries, self.aliases = {}, {}
+        # 🕒 Hits not written yet survive a reload of another process's index
+        for key, (last_access, hits) in self.touched.items():
+            entry = self.entries.get(key)
+            if entry:
+                entry['last_access'] = max(entry.get('last_access', 0), last_access)
+                entry['hits'] = entry.get('hits', 0) + hits
+
+    def _save(self):
+        tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'entries': self.entries, 'aliases': self.aliases}, f)
+            os.replace(tmp_path, self.index_path)
+            self.index_mtime = self._index_mtime()
+            self.touched = {}
+            self.last_save = time.time()
+        except OSError as e:
+            print(f"⚠️ Cache index save failed: {e}")
+
+    def _path(self, entry):
+        return os.path.join(self.root, entry['filename'])
+
+    def _drop(self, key):
+        self.entries.pop(key, None)
+        for alias, target in list(self.aliases.items()):
+            if target == key:
+                del self.aliases[alias]
+
+    def get(self, key):
+        """Return the entry for ``key`` if its file is still on disk"""
+        with self.lock:
+            self._refresh()
+            entry = self.entries.get(key)
+            if not entry:
+                return None
+            if not os.path.isfile(self._path(entry)):
+                with self._locked():
+                    self._refresh()
+                    self._drop(key)
+                    self._save()
+                return None
+            now = time.time()
+            entry['last_access'] = now
+            entry['hits'] = entry.get('hits', 0) + 1
+            self.touched[key] = (now, self.touched.get(key, (0, 0))[1] + 1)
+            result = dict(entry)
+            if now - self.last_save >= self.flush_interval:
+                with self._locked():
+                    self._refresh()
+                    self._save()
+            return result
+
+    def lookup_alias(self, alias):
+        """Resolve a URL alias to a cached entry without extraction"""
+        with self.lock:
+            self._refresh()
+            key = self.aliases.get(alias)
+            return self.get(key) if key else None
+
+    def add_alias(self, alias, key):
+        with self._locked():
+            self._refresh()
+            if key in self.entries and self.aliases.get(alias) != key:
+                self.aliases[alias] = key
+                self._save()
+
+    def put(self, key, filename, filesize, info=None, alias=None):
+        """Record a finished file and evict old entries over the size cap"""
+        with self._locked():
+            self._refresh()
+            now = time.time()
+            self.entries[key] = {
+                'filename': filename,
+                'filesize': filesize,
+                'info': info or {},
+                'created': now,
+                'last_access': now,
+                'hits': 0,
+            }
+            if alias:
+                self.aliases[alias] = key
+            self._evict(keep=key)
+            self._save()
+
+    def forget_file(self, filename):
+        """Drop entries whose file was removed by someone else"""
+        with self._locked():
+            self._refresh()
+            keys = [k for k, e in self.entries.items() if e['filename'] == filename]
+            for key in keys:
+                self._drop(key)
+            if keys:
+                self._save()
+
+    def total_bytes(self):
+        with self.lock:
+            return sum(e.get('filesize', 0) for e in self.entries.values())
+
+    def _evict(self, keep=None):
+        if self.max_bytes is None:
+            return
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self.entries.items(), key=lambda kv: kv[1].get('last_access', 0)):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self._path(entry))
+            except OSError:
+                pass
+            total -= entry.get('filesize', 0)
+            self._drop(key)
+            print(f"🗑️ Cache evicted: {entry['filename']}")
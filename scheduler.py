@@ -0,0 +1,193 @@
+import bisect
+import itertools
+import math
+import threading
+import time
+import traceback
+from collections import deque
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+
+class QueueFull(Exception):
+    """Raised by ``submit`` when the bounded queue is saturated"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Queue full - retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """🚦 Bounded priority queue with per-platform concurrency and rate caps
+
+    Workers always take the highest-priority queued job whose platform is
+    below its concurrency cap (``platform_limits``) and its starts-per-minute
+    cap (``platform_rates``), so one slow platform cannot take every slot.
+    ``on_change`` is called (outside the lock) whenever queue positions move.
+    """
+
+    def __init__(self, max_workers=4, max_queue=64, platform_limits=None,
+                 default_limit=None, platform_rates=None, on_change=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.platform_limits = platform_limits or {}
+        self.default_limit = default_limit or max_workers
+        self.platform_rates = platform_rates or {}
+        self.on_change = on_change
+        self.cond = threading.Condition()
+        self.queue = []
+        self.seq = itertools.count()
+        self.running = {}
+        self.starts = {}
+        self.avg_duration = 30.0
+        self.busy = 0
+        for i in range(max_workers):
+            threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True).start()
+
+    def submit(self, job_id, platform, fn, *args, priority='normal', **kwargs):
+        """Queue ``fn(*args, **kwargs)`` or raise ``QueueFull``"""
+        with self.cond:
+            if len(self.queue) >= self.max_queue:
+                raise QueueFull(self._retry_after())
+            entry = (PRIORITIES.get(priority, 1), next(self.seq), job_id, platform, fn, args, kwargs)
+            bisect.insort(self.queue, entry, key=lambda e: (e[0], e[1]))
+            self.cond.notify()
+        self._changed()
+
+    def _retry_after(self):
+        return max(1, math.ceil(self.avg_duration * len(self.queue) / self.max_workers))
+
+    def _rate_ok(self, platform, now):
+        rate = self.platform_rates.get(platform)
+        if not rate:
+            return True, None
+        starts = self.starts.setdefault(platform, deque())
+        while starts and now - starts[0] > 60:
+            starts.popleft()
+        if len(starts) < rate:
+            return True, None
+        return False, starts[0] + 60 - now
+
+    def _pick(self):
+        """Next runnable entry, or (None, seconds until a rate slot frees)"""
+        now = time.time()
+        wake = None
+        for index, entry in enumerate(self.queue):
+            platform = entry[3]
+            if self.running.get(platform, 0) >= self.platform_limits.get(platform, self.default_limit):
+                continue
+            ok, wait = self._rate_ok(platform, now)
+            if not ok:
+                wake = wait if wake is None else min(wake, wait)
+                continue
+            del self.queue[index]
+            self.starts.setdefault(platform, deque()).append(now)
+            return entry, None
+        return None, wake
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while True:
+                    entry, wake = self._pick()
+                    if entry:
+                        break
+                    self.cond.wait(wake)
+                platform = entry[3]
+                self.running[platform] = self.running.get(platform, 0) + 1
+                self.busy += 1
+            self._changed()
+            started = time.time()
+            try:
+                entry[4](*entry[5], **entry[6])
+            except Exception:
+                print(f"💥 Job {entry[2]} crashed: {traceback.format_exc()}")
+            finally:
+                with self.cond:
+                    self.running[platform] -= 1
+                    self.busy -= 1
+                    self.avg_duration = 0.8 * self.avg_duration + 0.2 * (time.time() - started)
+                    self.cond.notify_all()
+                self._changed()
+
+    def _changed(self):
+        if self.on_change:
+            try:
+                self.on_change()
+            except Exception:
+                pass
+
+    def queue_positions(self):
+        """[(job_id, position, estimated_wait_seconds)] in run order"""
+        with self.cond:
+            return [(entry[2], position, math.ceil(position / self.max_workers) * round(self.avg_duration))
+                    for position, entry in enumerate(self.queue, 1)]
+
+    def stats(self):
+        with self.cond:
+            return {
+                'queued': len(self.queue),
+                'running': self.busy,
+                'workers': self.max_workers,
+                'by_platform': {p: n for p, n in self.running.items() if n},
+            }
+
+
+class StagePool:
+    """🏭 Fixed threads for one pipeline stage, fed by the stage before it
+
+    ``submit`` blocks while ``max_backlog`` jobs are already waiting, so a
+    faster upstream stage slows down instead of piling finished downloads
+    up on disk. ``offer`` is for callers that must not wait - it raises
+    QueueFull (retry in ``retry_after`` s) instead.
+    """
+
+    def __init__(self, name, workers, max_backlog=None, retry_after=30):
+        self.name = name
+        self.workers = workers
+        self.retry_after = retry_after
+        self.backlog = threading.BoundedSemaphore(max_backlog) if max_backlog else None
+        self.cond = threading.Condition()
+        self.queue = deque()
+        self.busy = 0
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f'{name}-{i}', daemon=True).start()
+
+    def submit(self, job_id, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` - waits for room in the backlog, returns the queue position"""
+        if self.backlog is not None:
+            self.backlog.acquire()
+        with self.cond:
+            self.queue.append((job_id, fn, args, kwargs))
+            self.cond.notify()
+            return len(self.queue)
+
+    def offer(self, job_id, fn, *args, **kwargs):
+        """Like ``submit`` but never waits - QueueFull when the backlog is full"""
+        if self.backlog is not None and not self.backlog.acquire(blocking=False):
+            raise QueueFull(self.retry_after)
+        with self.cond:
+            self.queue.append((job_id, fn, args, kwargs))
+            self.cond.notify()
+            return len(self.queue)
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                job_id, fn, args, kwargs = self.queue.popleft()
+                self.busy += 1
+            if self.backlog is not None:
+                self.backlog.release()
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                print(f"💥 {self.name} job {job_id} crashed: {traceback.format_exc()}")
+            finally:
+                with self.cond:
+                    self.busy -= 1
+
+    def stats(self):
+        with self.cond:
+            return {'queued': len(self.queue), 'running': self.busy, 'workers': self.workers}
@@ -0,0 +1,72 @@
+import threading
+
+
+class Flight:
+    """One in-flight piece of work that later callers can attach to"""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.followers = []
+        self.done = threading.Event()
+        self.result = None
+        self.lock = threading.Lock()
+        self.callbacks = []
+
+    def add_done_callback(self, fn):
+        """Call ``fn(flight)`` once the leader finishes - at once if it already has"""
+        with self.lock:
+            if not self.done.is_set():
+                self.callbacks.append(fn)
+                return
+        fn(self)
+
+    def _complete(self, result):
+        with self.lock:
+            self.result = result
+            self.done.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception as e:
+                print(f"⚠️ Flight callback failed: {e}")
+
+
+class SingleFlight:
+    """🛫 Coalesce concurrent work on the same key
+
+    The first caller to ``join`` a key becomes the leader and must call
+    ``finish`` when done. Everyone else gets the same ``Flight`` back and
+    can wait on ``flight.done`` for the leader's result, or hand it a
+    callback and give its thread back meanwhile.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def join(self, key, owner):
+        """Return ``(flight, is_leader)`` for ``key``"""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                flight.followers.append(owner)
+                return flight, False
+            flight = self.flights[key] = Flight(owner)
+            return flight, True
+
+    def get(self, key):
+        with self.lock:
+            return self.flights.get(key)
+
+    def finish(self, key, result=None):
+        """Publish the leader's result and release the key"""
+        with self.lock:
+            flight = self.flights.pop(key, None)
+        if flight is not None:
+            flight._complete(result)
+        return flight
+
+    def __len__(self):
+        with self.lock:
+            return len(self.flights)
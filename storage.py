@@ -0,0 +1,224 @@
+import os
+import shutil
+import threading
+import time
+
+
+class StorageManager:
+    """🧹 Byte quota, LRU eviction and temp cleanup for static/downloads
+
+    Keeps an in-memory index of finished files (size, last access, job id)
+    so nothing has to scan the directory per job - the directory is listed
+    once at startup. When the total passes ``quota_bytes``, the least
+    recently used files are removed until it drops to ``low_water_bytes``.
+    Files with an open download (``pin``) are never evicted. A background
+    sweep removes ``.temp/<job>`` directories that no running job owns:
+    ones an unfinished job will resume from (``resumable()``, names from
+    the job store) after ``temp_max_age`` seconds idle, any other after
+    ``orphan_grace`` seconds.
+
+    With ``shared=True`` other processes (worker mode) add files too, so
+    every quota check rebuilds the index from a directory listing first,
+    every ``quota_interval`` seconds. Only the process that holds the
+    pins (the web tier) should evict - the others pass ``evict=False``.
+    """
+
+    def __init__(self, root='static/downloads', quota_bytes=5 * 1024 ** 3, low_water_bytes=None,
+                 temp_max_age=6 * 3600, sweep_interval=300, on_evict=None, resumable=None,
+                 orphan_grace=600, evict=True, shared=False, quota_interval=30):
+        self.root = root
+        self.temp_root = os.path.join(root, '.temp')
+        self.quota_bytes = quota_bytes
+        self.low_water_bytes = low_water_bytes if low_water_bytes is not None else int(quota_bytes * 0.8)
+        self.temp_max_age = temp_max_age
+        self.sweep_interval = sweep_interval
+        self.on_evict = on_evict
+        self.resumable = resumable or set
+        self.orphan_grace = orphan_grace
+        self.evict = evict
+        self.shared = shared
+        self.quota_interval = quota_interval
+        self.lock = threading.Lock()
+        self.files = {}
+        self.total = 0
+        self.pins = {}
+        self.active_temp = set()
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the index and total from a directory listing - at startup, and per quota check when shared
+
+        Sizes come from disk, known access times are kept. ctime counts as
+        an access: yt-dlp sets mtime from the server, the move into place
+        updates ctime.
+        """
+        found = {}
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file() and not entry.name.startswith('.'):
+                            st = entry.stat()
+                            found[entry.name] = (st.st_size, max(st.st_mtime, st.st_ctime))
+                    except OSError:
+                        continue  # removed while listing
+        except OSError:
+            return
+        with self.lock:
+            files = {}
+            for name, (size, changed) in found.items():
+                known = self.files.get(name)
+                files[name] = {'size': size, 'last_access': max(changed, known['last_access']) if known else changed,
+                               'job_id': known['job_id'] if known else None}
+            self.files = files
+            self.total = sum(entry['size'] for entry in files.values())
+
+    # --- finished files ---------------------------------------------------
+    def register(self, filename, size, job_id=None):
+        """Add a finished file and enforce the quota"""
+        with self.lock:
+            old = self.files.get(filename)
+            if old:
+                self.total -= old['size']
+            self.files[filename] = {'size': size, 'last_access': time.time(), 'job_id': job_id}
+            self.total += size
+        if not self.shared:
+            self.enforce()
+
+    def touch(self, filename):
+        with self.lock:
+            entry = self.files.get(filename)
+            if entry:
+                entry['last_access'] = time.time()
+
+    def pin(self, filename):
+        """Mark a file as being served - returns the matching ``unpin``"""
+        with self.lock:
+            self.pins[filename] = self.pins.get(filename, 0) + 1
+            entry = self.files.get(filename)
+            if entry:
+                entry['last_access'] = time.time()
+        released = []
+
+        def unpin():
+            if released:
+                return
+            released.append(True)
+            with self.lock:
+                self.pins[filename] -= 1
+                if self.pins[filename] <= 0:
+                    del self.pins[filename]
+        return unpin
+
+    def forget(self, filename):
+        with self.lock:
+            entry = self.files.pop(filename, None)
+            if entry:
+                self.total -= entry['size']
+
+    def enforce(self):
+        """Evict LRU files down to the low-water mark once over quota"""
+        if not self.evict:
+            return []
+        if self.shared:
+            self._scan()
+        with self.lock:
+            if self.total <= self.quota_bytes:
+                return []
+            victims = []
+            for filename, entry in sorted(self.files.items(), key=lambda kv: kv[1]['last_access']):
+                if self.total <= self.low_water_bytes:
+                    break
+                if filename in self.pins:
+                    continue
+                victims.append(filename)
+                self.total -= entry['size']
+                del self.files[filename]
+        for filename in victims:
+            try:
+                os.remove(os.path.join(self.root, filename))
+            except OSError:
+                pass
+            print(f"🗑️ Quota evicted: {filename}")
+            if self.on_evict:
+                self.on_evict(filename)
+        return victims
+
+    def usage(self):
+        with self.lock:
+            return {'files': len(self.files), 'bytes': self.total, 'quota': self.quota_bytes,
+                    'low_water': self.low_water_bytes, 'serving': len(self.pins)}
+
+    # --- per-job temp dirs ------------------------------------------------
+    def claim_temp(self, name):
+        """Reserve ``.temp/<name>`` for a running job"""
+        with self.lock:
+            self.active_temp.add(name)
+        return os.path.join(self.temp_root, name)
+
+    def release_temp(self, name, remove=True):
+        with self.lock:
+            self.active_temp.discard(name)
+        if remove:
+            shutil.rmtree(os.path.join(self.temp_root, name), ignore_errors=True)
+
+    def _last_write(self, path):
+        newest = os.path.getmtime(path)
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    newest = max(newest, entry.stat().st_mtime)
+                except OSError:
+                    pass
+        return newest
+
+    def sweep_temp(self):
+        """Remove abandoned ``.temp/<job>`` dirs - by job state first, then by idle time"""
+        removed = 0
+        now = time.time()
+        try:
+            with os.scandir(self.temp_root) as it:
+                entries = [e for e in it if e.is_dir()]
+        except OSError:
+            return 0
+        try:
+            resumable = self.resumable()
+        except Exception as e:
+            print(f"⚠️ Resumable job lookup failed, sweeping by age only: {e}")
+            resumable = None
+        for entry in entries:
+            with self.lock:
+                if entry.name in self.active_temp:
+                    continue
+            # ♻️ Partial data a restarted job will pick up keeps the long limit
+            if resumable is None or entry.name in resumable:
+                max_age = self.temp_max_age
+            else:
+                max_age = self.orphan_grace
+            try:
+                if now - self._last_write(entry.path) < max_age:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+            print(f"🧹 Removed orphaned temp: {entry.name}")
+        return removed
+
+    def start(self):
+        """Background sweep - temp cleanup every ``sweep_interval``, quota as well (``quota_interval`` when shared)"""
+        interval = min(self.quota_interval, self.sweep_interval) if self.shared else self.sweep_interval
+
+        def loop():
+            last_sweep = 0
+            while True:
+                try:
+                    if time.time() - last_sweep >= self.sweep_interval:
+                        last_sweep = time.time()
+                        self.sweep_temp()
+                    self.enforce()
+                except Exception as e:
+                    print(f"⚠️ Storage sweep failed: {e}")
+                time.sleep(interval)
+        threading.Thread(target=loop, name='storage-sweeper', daemon=True).start()
+        return self
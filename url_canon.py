@@ -0,0 +1,160 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# 🗂️ Host suffix -> platform, matched label by label from the full host down
+HOST_INDEX = {
+    'instagram.com': 'Instagram',
+    'instagr.am': 'Instagram',
+    'facebook.com': 'Facebook',
+    'fb.com': 'Facebook',
+    'fb.watch': 'Facebook',
+    'youtube.com': 'YouTube',
+    'youtube-nocookie.com': 'YouTube',
+    'youtu.be': 'YouTube',
+    'tiktok.com': 'TikTok',
+    'twitter.com': 'X',
+    'x.com': 'X',
+}
+
+# 🧹 Share/tracking params that never change which media a URL points at
+TRACKING_PARAMS = frozenset(('fbclid', 'gclid', 'mibextid'))
+TRACKING_PREFIXES = ('utm_',)
+PLATFORM_TRACKING_PARAMS = {
+    'YouTube': frozenset(('si', 'feature', 'pp', 'ab_channel', 't')),
+    'Instagram': frozenset(('igsh', 'igshid', 'img_index')),
+    'TikTok': frozenset(('is_from_webapp', 'sender_device', 'web_id', '_r', '_t', 'lang')),
+    'X': frozenset(('s', 't', 'ref_src', 'ref_url')),
+    'Facebook': frozenset(('rdid', 'share_url', 'ref')),
+}
+
+YOUTUBE_ID = re.compile(r'[\w-]{11}$')
+YOUTUBE_PATH = re.compile(r'^/(?:shorts|embed|live|v|e)/([\w-]{11})(?:[/?]|$)')
+INSTAGRAM_PATH = re.compile(r'^/(?:[\w.]+/)?(?:p|reels?|tv)/([\w-]+)')
+TIKTOK_PATH = re.compile(r'^/(?:@[\w.-]+/(?:video|photo)/|v/|embed/(?:v2/)?)(\d+)')
+X_PATH = re.compile(r'^/(?:\w+|i/web)/status(?:es)?/(\d+)')
+FACEBOOK_PATH = re.compile(r'^/(?:[\w.-]+/videos/(?:[\w.-]+/)?|reel/)(\d+)')
+
+
+class CanonicalURL(namedtuple('CanonicalURL', 'platform media_id url')):
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """Same key for every form of the same media - the cleaned URL when no id is known"""
+        return f'{self.platform}:{self.media_id}' if self.media_id else f'url:{self.url}'
+
+
+def _youtube_id(host, path, query):
+    if host == 'youtu.be':
+        candidate = path.strip('/').split('/')[0]
+        return candidate if YOUTUBE_ID.match(candidate) else None
+    if path.rstrip('/') == '/watch' and YOUTUBE_ID.match(query.get('v', '')):
+        return query['v']
+    match = YOUTUBE_PATH.match(path)
+    return match and match.group(1)
+
+
+def _instagram_id(host, path, query):
+    match = INSTAGRAM_PATH.match(path)
+    return match and match.group(1)
+
+
+def _tiktok_id(host, path, query):
+    match = TIKTOK_PATH.match(path)
+    return match and match.group(1)
+
+
+def _x_id(host, path, query):
+    match = X_PATH.match(path)
+    return match and match.group(1)
+
+
+def _facebook_id(host, path, query):
+    if path.rstrip('/') in ('/watch', '/video.php', '/watch/live') and query.get('v', '').isdigit():
+        return query['v']
+    match = FACEBOOK_PATH.match(path)
+    return match and match.group(1)
+
+
+# Short links (fb.watch, vm.tiktok.com, /share/...) need a redirect - those keep the URL as key
+ID_PARSERS = {
+    'YouTube': _youtube_id,
+    'Instagram': _instagram_id,
+    'TikTok': _tiktok_id,
+    'X': _x_id,
+    'Facebook': _facebook_id,
+}
+
+
+def platform_for_host(host):
+    labels = host.split('.')
+    for i in range(len(labels) - 1):
+        platform = HOST_INDEX.get('.'.join(labels[i:]))
+        if platform:
+            return platform
+    return 'Video'
+
+
+def _keep_param(name, platform):
+    name = name.lower()
+    if name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES):
+        return False
+    return name not in PLATFORM_TRACKING_PARAMS.get(platform, ())
+
+
+def _netloc(parts):
+    """Lowercased host (IPv6 kept in brackets) and port - the raw netloc when the port is invalid"""
+    host = parts.hostname or ''
+    if ':' in host:
+        host = f'[{host}]'
+    try:
+        port = parts.port
+    except ValueError:
+        return parts.netloc
+    return host + (f':{port}' if port else '')
+
+
+@lru_cache(maxsize=4096)
+def canonicalize(url):
+    """🔑 ``CanonicalURL(platform, media_id, url)`` for a submitted URL - no network access
+
+    ``url`` is the input with a lowercased host and without fragment or
+    tracking params. ``media_id`` is None when the URL form carries no id
+    (short links, profiles, unknown sites). URLs that do not parse
+    (``https://[abc/x``) come back unchanged as a 'Video' with no id.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return CanonicalURL('Video', None, url.strip())
+    host = (parts.hostname or '').rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    platform = platform_for_host(host)
+    query_pairs = parse_qsl(parts.query, keep_blank_values=True)
+    query = dict(query_pairs)
+    parser = ID_PARSERS.get(platform)
+    media_id = parser(host, parts.path or '/', query) if parser else None
+
+    netloc = _netloc(parts)
+    kept = [(k, v) for k, v in query_pairs if _keep_param(k, platform)]
+    clean = urlunsplit((parts.scheme.lower() or 'https', netloc, parts.path or '/', urlencode(kept), ''))
+    return CanonicalURL(platform, media_id or None, clean)
+
+
+def canonicalize_many(urls):
+    """Canonicalize a batch - regexes and the host index are compiled once at import"""
+    return [canonicalize(url) for url in urls]
+
+
+def dedupe_urls(urls):
+    """First URL of every distinct media, in input order"""
+    seen = set()
+    unique = []
+    for url, canon in zip(urls, canonicalize_many(urls)):
+        if canon.key not in seen:
+            seen.add(canon.key)
+            unique.append(url)
+    return unique
@@ -0,0 +1,139 @@
+"""⚙️ Download worker processes for WORKER_QUEUE_PATH mode
+
+Runs bulletproof_social_download outside the Flask process so extraction
+and ffmpeg work never compete with the status and file-serving routes.
+
+    WORKER_QUEUE_PATH=queue.db python app.py        # web tier
+    WORKER_QUEUE_PATH=queue.db python worker.py -p 8   # workers (any host sharing the files)
+
+Progress flows back to the web tier through the shared SQLite job store.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+
+
+def start_heartbeat(app, worker_id, active, lock):
+    """💓 Renew this process's claims and job records while they run
+
+    Fetches, ffmpeg runs and coalesced waits can outlast any fixed lease -
+    without this a long job would be claimed again and shown as interrupted.
+    """
+    def loop():
+        while True:
+            time.sleep(app.HEARTBEAT_INTERVAL)
+            with lock:
+                job_ids = list(active)
+            try:
+                held = set(app.job_queue.heartbeat(worker_id, job_ids))
+                for job_id in job_ids:
+                    if job_id not in held:
+                        print(f"⚠️ Worker {worker_id} lost its claim on {job_id}")
+                    app.download_status.touch(job_id)
+            except Exception as e:
+                print(f"⚠️ Heartbeat failed: {e}")
+    threading.Thread(target=loop, name='heartbeat', daemon=True).start()
+
+
+def worker_loop(worker_id, poll_interval):
+    import app  # 🔑 Imported per process - each worker gets its own yt-dlp state
+
+    if not app.WORKER_MODE:
+        raise SystemExit("❌ Set WORKER_QUEUE_PATH to the same queue file as the web tier")
+    app.registry.start_dumping(os.path.join(app.METRICS_DIR, f'{worker_id}.json'))
+    active = set()
+    active_lock = threading.Lock()
+    start_heartbeat(app, worker_id, active, active_lock)
+    print(f"⚙️ Worker {worker_id} ready")
+    while True:
+        job = app.job_queue.claim(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        download_id, payload = job
+        with active_lock:
+            active.add(download_id)
+        app.publish_queue_positions()
+
+        def finish(download_id=download_id, started=time.time()):
+            with active_lock:
+                active.discard(download_id)
+            app.job_queue.complete(download_id, time.time() - started)
+            app.publish_queue_positions()
+
+        # 🏭 Returns once the download is on disk - ffmpeg work finishes on the process's
+        # ffmpeg pool and completes the claim, while this loop claims the next job
+        try:
+            app.run_queued_job(download_id, payload, on_finish=finish)
+        except Exception:
+            print(f"💥 Worker {worker_id} job {download_id}: {traceback.format_exc()}")
+            finish()
+
+
+def release_dead_claims(host):
+    """♻️ Jobs claimed by crashed workers on this host go back to the queue at once
+
+    Their job records keep the resume state, so the next worker continues
+    the partial download. Claims from other hosts wait out claim_timeout.
+    Runs before the fork, so it opens the queue directly instead of importing app.
+    """
+    from job_queue import SQLiteJobQueue
+
+    path = os.environ.get('WORKER_QUEUE_PATH')
+    if not path:
+        return
+
+    def is_alive(worker_id):
+        worker_host = (worker_id or '').rpartition('-')[0]
+        worker_host, _, pid = worker_host.rpartition('-')
+        if worker_host != host or not pid.isdigit():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    queue = SQLiteJobQueue(path)
+    for job_id in queue.release_dead_claims(is_alive):
+        print(f"♻️ Requeued interrupted job {job_id}")
+    queue.local.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download worker pool')
+    parser.add_argument('-p', '--processes', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--poll', type=float, default=0.5, help='idle queue poll interval (s)')
+    args = parser.parse_args()
+
+    host = socket.gethostname()
+    release_dead_claims(host)
+    # 🏭 Every process has its own ffmpeg pool and fetch tuner - split the cores and connections
+    os.environ.setdefault('FFMPEG_WORKERS', str(max(1, (os.cpu_count() or 2) // args.processes)))
+    budget = int(os.environ.get('FETCH_CONNECTION_BUDGET', 16))
+    os.environ['FETCH_CONNECTION_BUDGET'] = str(max(1, budget // args.processes))
+    # 🧹 Files being served are pinned in the web tier - only it may evict
+    os.environ['STORAGE_EVICT'] = '0'
+    procs = []
+    for i in range(args.processes):
+        worker_id = f'{host}-{os.getpid()}-{i}'
+        proc = multiprocessing.Process(target=worker_loop, args=(worker_id, args.poll), name=worker_id)
+        proc.start()
+        procs.append(proc)
+    print(f"🔥 {len(procs)} workers started")
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+from yt_dlp.cookies import YoutubeDLCookieJar
+from yt_dlp.postprocessor import get_postprocessor
+from yt_dlp.utils import POSTPROCESS_WHEN
+
+# Applied by reset() instead of YoutubeDL.__init__ - everything else is a plain param
+HOOK_ATTRS = {'progress_hooks': '_progress_hooks', 'post_hooks': '_post_hooks',
+              'postprocessor_hooks': '_postprocessor_hooks'}
+
+
+class SharedCookieJar:
+    """🍪 One parsed cookies.txt for every pooled downloader - reparsed only when the file changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.jar = YoutubeDLCookieJar()
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return self.jar
+        with self.lock:
+            if mtime == self.mtime:
+                return self.jar
+            fresh = YoutubeDLCookieJar(self.path)
+            if mtime is not None:
+                try:
+                    fresh.load()
+                except Exception as e:
+                    print(f"⚠️ Cookie file unreadable, keeping old cookies: {e}")
+                    return self.jar
+            # Swap in place - running jobs and request handlers hold this jar
+            with self.jar._cookies_lock:
+                self.jar._cookies = fresh._cookies
+            self.mtime = mtime
+            print(f"🍪 Cookies {'reloaded' if mtime else 'cleared'}: {self.path}")
+        return self.jar
+
+
+class YDLPool:
+    """🏊 Long-lived YoutubeDL instances, one idle list per pool key
+
+    Building a YoutubeDL loads the extractor table, and a fresh one opens
+    new connections and re-reads cookies. Pooled instances keep their
+    request handlers (keep-alive sessions) and extractor instances between
+    jobs. ``base_opts(key)`` gives the options fixed for the instance's life -
+    headers, timeouts and anything else baked into the HTTP handlers. Per-job
+    options (hooks, paths, outtmpl, format) are laid over a snapshot of those
+    on every checkout, so nothing leaks from one job to the next.
+    An instance is used by one job at a time.
+    """
+
+    def __init__(self, base_opts, cookie_jar=None, cookie_keys=(), max_idle=4):
+        self.base_opts = base_opts
+        self.cookie_jar = cookie_jar
+        self.cookie_keys = set(cookie_keys)
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.created = 0
+        self.reused = 0
+
+    def _create(self, key):
+        ydl = yt_dlp.YoutubeDL(dict(self.base_opts(key)))
+        if self.cookie_jar is not None and key in self.cookie_keys:
+            # cached_property slot - set before the first request builds the handlers
+            ydl.__dict__['cookiejar'] = self.cookie_jar.jar
+        base_params = dict(ydl.params)
+        base_params['outtmpl'] = dict(ydl.params.get('outtmpl') or {})
+        with self.lock:
+            self.created += 1
+        return ydl, base_params
+
+    @staticmethod
+    def reset(ydl, base_params, job_opts):
+        """Lay ``job_opts`` over the instance's base params and clear per-run state"""
+        params = {**base_params, 'outtmpl': dict(base_params['outtmpl'])}
+        params.update({k: v for k, v in job_opts.items() if k not in HOOK_ATTRS})
+        ydl.params = params
+        YDLPool.set_timeout(ydl, params.get('socket_timeout'))
+        ydl._parse_outtmpl()
+        fmt = params.get('format')
+        ydl.format_selector = fmt if fmt in (None, '-') or callable(fmt) else ydl.build_format_selector(fmt)
+        for opt, attr in HOOK_ATTRS.items():
+            setattr(ydl, attr, list(job_opts.get(opt) or []))
+        ydl._pps = {when: [] for when in POSTPROCESS_WHEN}
+        ydl.__dict__.pop('post_process', None)  # a job's deferred-postprocess override
+        for pp_def in params.get('postprocessors') or []:
+            pp_def = dict(pp_def)
+            when = pp_def.pop('when', 'post_process')
+            ydl.add_post_processor(get_postprocessor(pp_def.pop('key'))(ydl, **pp_def), when=when)
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls = set()
+        ydl._printed_messages = set()
+        ydl._YoutubeDL__header_cookies = []
+
+    @staticmethod
+    def set_timeout(ydl, seconds):
+        """Socket timeout that also reaches request handlers already built - they read it per request"""
+        ydl.params['socket_timeout'] = seconds
+        if seconds and '_request_director' in ydl.__dict__:
+            for handler in ydl._request_director.handlers.values():
+                handler.timeout = float(seconds)
+
+    @staticmethod
+    def update_params(ydl, params):
+        """Change params in the middle of a job - read at download time, so they apply to the next fetch"""
+        ydl.params.update(params)
+        if 'socket_timeout' in params:
+            YDLPool.set_timeout(ydl, params['socket_timeout'])
+
+    @contextmanager
+    def session(self, key, job_opts):
+        """Check out a downloader for ``key`` configured with ``job_opts``"""
+        if self.cookie_jar is not None and key in self.cookie_keys:
+            self.cookie_jar.refresh()
+        with self.lock:
+            entry = self.idle.get(key, []) and self.idle[key].pop()
+            if entry:
+                self.reused += 1
+        ydl, base_params = entry or self._create(key)
+        self.reset(ydl, base_params, job_opts)
+        try:
+            yield ydl
+        finally:
+            self.reset(ydl, base_params, {})  # drop the job's hooks and closures
+            with self.lock:
+                idle = self.idle.setdefault(key, [])
+                keep = len(idle) < self.max_idle
+                if keep:
+                    idle.append((ydl, base_params))
+            if not keep:
+                ydl.close()
+
+    def stats(self):
+        with self.lock:
+            return {'idle': sum(len(v) for v in self.idle.values()),
+                    'created': self.created, 'reused': self.reused}
@@ -1,11 +1,17 @@
 import yt_dlp
 import os
 import time
+from metadata_cache import shared_cache as metadata_cache
+from postprocess import AUDIO_FORMATS
+from format_budget import make_budget, fit_format, pin_format
 
 def download_video(url, output_path, format_type='mp4', quality='720p', 
-                  status_dict=None, download_id=None):
-    """🚀 FAST Download with REAL progress updates"""
-    
+                  status_dict=None, download_id=None, max_size=None, max_bitrate=None):
+    """🚀 FAST Download with REAL progress updates
+
+    📏 ``max_size`` ('50M' or bytes) / ``max_bitrate`` (kbit/s) pick the best
+    rendition under the limit instead of the fixed quality cap alone.
+    """
     def progress_hook(d):
         if d['status'] == 'downloading':
             # 🔥 REAL PROGRESS from yt-dlp
@@ -33,13 +39,13 @@ def download_video(url, output_path, format_type='mp4', quality='720p',
         'no_warnings': True,
     }
     
-    # 🎯 Format selection
-    if format_type == 'mp3':
+    # 🎯 Format selection - m4a/opus sources are stream-copied by FFmpegExtractAudio
+    if format_type in AUDIO_FORMATS:
         ydl_opts.update({
-            'format': 'bestaudio/best',
+            'format': AUDIO_FORMATS[format_type]['selector'],
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
+                'preferredcodec': format_type,
                 'preferredquality': '192',
             }],
         })
@@ -54,8 +60,15 @@ def download_video(url, output_path, format_type='mp4', quality='720p',
         ydl_opts['format'] = format_map.get(quality, 'best[height<=720]')
     
     try:
+        budget = make_budget(max_size=max_size, max_bitrate=max_bitrate)
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+            # 🧠 Reuse cached metadata while its format URLs are still valid
+            meta = metadata_cache.lookup(url)
+            if meta and meta.downloadable():
+                info = meta.info
+            else:
+                info = ydl.extract_info(url, download=False)
+                metadata_cache.put(url, ydl.sanitize_info(info))
             
             title = info.get('title', 'Unknown')
             duration = info.get('duration', 0)
@@ -72,8 +85,15 @@ def download_video(url, output_path, format_type='mp4', quality='720p',
             elif 'twitter' in url.lower() or 'x.com' in url.lower():
                 platform = 'Twitter/X'
             
-            # Download
-            ydl.download([url])
+            # 📏 Best format under the budget, from the extracted format list
+            chosen, estimate, fits = fit_format(ydl, info, budget)
+            if fits is False:
+                return False, f"No format fits the budget - smallest is ~{estimate / 1024 / 1024:.1f} MB"
+            if budget and chosen is not info:
+                pin_format(ydl, chosen, ydl_opts['format'])
+            
+            # Download from the resolved info - no second extraction
+            ydl.process_ie_result(info, download=True)
             
             if os.path.exists(output_path):
                 return True, {
@@ -82,6 +102,9 @@ def download_video(url, output_path, format_type='mp4', quality='720p',
                     'uploader': uploader,
                     'platform': platform,
                     'quality': quality,
+                    'format_id': chosen.get('format_id'),
+                    'estimated_size': estimate,
+                    'within_budget': fits,
                 }
             
         return False, "Download failed"